@@ -4,8 +4,11 @@ from __future__ import print_function
 import io
 import sys
 import logging
+import hashlib
 import random
+from collections import Counter, defaultdict
 from argparse import ArgumentParser
+from common.multisets import count_arrangements
 
 _BLANK = '_'
 _log = logging.getLogger('anagrammery_interactive')
@@ -13,22 +16,119 @@ _CMD_LAST = '/'
 _CMD_EXIT = '/EXIT'
 _CMD_SHUFFLE = '/SHUFFLE'
 _CMD_ALPHABETIZE = '/ALPHABETIZE'
+_CMD_WORDS = '/WORDS'
+_CMD_UNDO = '/UNDO'
+_SOURCE_LETTERS, _SOURCE_BLANK, _SOURCE_STRANGER = 'letters', 'blank', 'stranger'
 _ALIASES = {
     '/LAST': '/',
     '/QUIT': '/EXIT',
     '/ALPHA': '/ALPHABETIZE',
     '/A': '/ALPHABETIZE',
+    '/W': '/WORDS',
+    '/U': '/UNDO',
 }
-_SAMPLE_COMMANDS = tuple([c.lower() for c in (_CMD_SHUFFLE, _CMD_ALPHABETIZE, _CMD_EXIT)])
+_SAMPLE_MAX = 1 << 20
+_SAMPLE_COMMANDS = tuple([c.lower() for c in (_CMD_SHUFFLE, _CMD_ALPHABETIZE, _CMD_WORDS, _CMD_UNDO, _CMD_EXIT)])
+
+
+def unrank_arrangement(counts, rank):
+    """Return the distinct arrangement of a multiset at the given rank in lexicographic order."""
+    counts = dict(counts)
+    items = sorted(item for item, count in counts.items() if count > 0)
+    total = count_arrangements(counts)
+    assert 0 <= rank < total, "rank must be less than the number of arrangements"
+    arrangement = []
+    for remaining in range(sum(counts.values()), 0, -1):
+        for item in items:
+            count = counts[item]
+            if count == 0:
+                continue
+            # arrangements of the rest that start with this item
+            block = total * count // remaining
+            if rank < block:
+                arrangement.append(item)
+                counts[item] -= 1
+                total = block
+                break
+            rank -= block
+    return tuple(arrangement)
+
+
+class _RandomPermutation(object):
+    """Pseudo-random permutation of range(size) in constant memory.
+
+    A balanced Feistel network, whose round function is a keyed BLAKE2
+    digest, permutes the smallest range of an even number of bits that
+    covers size. Values that land outside range(size) are passed through
+    the network again until they land inside, which keeps the mapping a
+    permutation (cycle walking). Meant for sizes too large to sample
+    from directly; its distribution is close to, not exactly, uniform.
+    """
+
+    ROUNDS = 10
+
+    def __init__(self, size, rng=random):
+        self.size = size
+        bits = max(2, (size - 1).bit_length())
+        self.half = (bits + 1) // 2
+        self.mask = (1 << self.half) - 1
+        self.nbytes = (self.half + 7) // 8
+        self.keys = [rng.getrandbits(128).to_bytes(16, 'little') for _ in range(self.ROUNDS)]
+
+    def _round(self, value, key):
+        digest = hashlib.blake2b(value.to_bytes(self.nbytes, 'little'), key=key, digest_size=min(64, self.nbytes + 8)).digest()
+        return int.from_bytes(digest, 'little') & self.mask
+
+    def _encrypt(self, value):
+        left, right = value >> self.half, value & self.mask
+        for key in self.keys:
+            left, right = right, left ^ self._round(right, key)
+        return (left << self.half) | right
+
+    def __getitem__(self, index):
+        assert 0 <= index < self.size, "index out of range"
+        value = self._encrypt(index)
+        while value >= self.size:
+            value = self._encrypt(value)
+        return value
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for index in range(self.size):
+            yield self[index]
+
+
+def _random_ranks(total, n, rng=random):
+    """Return min(n, total) distinct random ranks below total, in random order.
+
+    Up to _SAMPLE_MAX arrangements, ranks are drawn with rng.sample, which
+    is exactly uniform; beyond that, from a _RandomPermutation, whose
+    memory does not grow with n.
+    """
+    n = min(n, total)
+    if total <= _SAMPLE_MAX:
+        return rng.sample(range(total), n)
+    ranks = _RandomPermutation(total, rng)
+    return (ranks[index] for index in range(n))
 
 
 class LetterPool(object):
+    """Pool of letters and blanks from which letters are used up.
+
+    The letters remaining are kept as a multiset, so consuming a letter and
+    undoing it take constant time. Each used letter records whether it came
+    from the letters, from a blank, or from neither (only in lenient mode).
+    """
 
     def __init__(self, letters, num_blanks):
         self.letters = tuple(letters)
         self.original_num_blanks = num_blanks
         self.num_blanks = num_blanks
+        self.remaining = Counter(self.letters)
         self.used = []
+        self._sources = []
         self.mode = 'strict'
     
     @classmethod
@@ -40,42 +140,58 @@ class LetterPool(object):
         return LetterPool(clean_letters, num_blanks)
     
     def render(self):
-        unused = list(self.letters)
-        strangers = []
-        for ch in self.used:
-            try:
-                unused.remove(ch)
-            except ValueError:
-                pass
         blanks = ['?' for i in range(self.num_blanks)]
-        return "{} {}".format(' '.join(unused), ''.join(blanks))
+        return "{} {}".format(' '.join(self.get_unused()), ''.join(blanks))
     
     def reset(self):
         self.used.clear()
+        self._sources.clear()
+        self.remaining = Counter(self.letters)
         self.num_blanks = self.original_num_blanks
     
     def get_unused(self):
-        unused = list(self.letters)
-        for lt in self.used:
-            unused.remove(lt)
+        """Return the remaining letters, in the order of the pool; the first of each letter are used first."""
+        skip = Counter(self.letters)
+        skip.subtract(self.remaining)
+        unused = []
+        for lt in self.letters:
+            if skip[lt] > 0:
+                skip[lt] -= 1
+            else:
+                unused.append(lt)
         return unused
 
     def consume(self, chars):
         strangers = []
         for ch in chars:
             if ch.strip():
-                strange = False
-                unused = self.get_unused()
-                if not ch in unused:
-                    if self.num_blanks > 0:
-                        self.num_blanks -= 1
-                    else:
-                        strange = True
-                        strangers.append(ch)
-                if not strange or self.mode == 'lenient':
-                    self.used.append(ch)
+                if self.remaining[ch] > 0:
+                    self.remaining[ch] -= 1
+                    source = _SOURCE_LETTERS
+                elif self.num_blanks > 0:
+                    self.num_blanks -= 1
+                    source = _SOURCE_BLANK
+                else:
+                    strangers.append(ch)
+                    if self.mode != 'lenient':
+                        continue
+                    source = _SOURCE_STRANGER
+                self.used.append(ch)
+                self._sources.append(source)
         if strangers:
             _log.info("\"used\" letters not in pool: %s", strangers)
+
+    def undo(self, n=1):
+        """Put back the last n used letters and return them, most recent first."""
+        undone = []
+        while self.used and len(undone) < n:
+            ch, source = self.used.pop(), self._sources.pop()
+            if source == _SOURCE_LETTERS:
+                self.remaining[ch] += 1
+            elif source == _SOURCE_BLANK:
+                self.num_blanks += 1
+            undone.append(ch)
+        return undone
     
     def shuffle(self):
         shuffled = list(self.letters)
@@ -88,13 +204,90 @@ class LetterPool(object):
             random.shuffle(shuffled)
             return tuple(shuffled)
         else:
-            return set([self.get_shuffled(subset=self.get_unused()) for i in range(n)])
+            return set(self.iterate_shuffled(n, subset))
+
+    def count_shuffled(self, subset=None):
+        """Return the number of distinct arrangements of the unused letters, or of a subset."""
+        return count_arrangements(Counter(self.get_unused() if subset is None else subset))
+
+    def iterate_shuffled(self, n, subset=None, rng=random):
+        """Generate min(n, count_shuffled()) distinct random arrangements of the unused letters, or of a subset.
+
+        Random ranks are drawn without replacement and unranked into
+        arrangements, so no arrangement is made twice; see _random_ranks.
+        """
+        counts = Counter(self.get_unused() if subset is None else subset)
+        for rank in _random_ranks(count_arrangements(counts), n, rng):
+            yield unrank_arrangement(counts, rank)
     
     def alphabetize(self):
         alphabetized = sorted(self.letters)
         self.letters = alphabetized
 
 
+class SpellableWords(object):
+    """Words that can still be spelled from what remains of a letter pool.
+
+    For each word, the tracker keeps its deficit, the number of its letters
+    that the remaining letters cannot supply; a word is spellable if its
+    deficit is no more than the number of blanks remaining. Words are
+    bucketed by deficit, and when the count of a remaining letter changes,
+    only the words needing that many of the letter move between buckets.
+    Letters only ever run out, so words that cannot be spelled from the
+    full pool are not tracked at all.
+    """
+
+    def __init__(self, words, pool):
+        self.remaining = Counter(pool.letters)
+        capacity = len(pool.letters) + pool.original_num_blanks
+        self.words = []
+        self.deficits = []
+        self.buckets = defaultdict(set)
+        self._needing = defaultdict(lambda: defaultdict(list))
+        for word in sorted(set(words)):
+            if len(word) > capacity:
+                continue
+            counts = Counter(word)
+            deficit = sum(max(0, count - self.remaining[lt]) for lt, count in counts.items())
+            if deficit > pool.original_num_blanks:
+                continue
+            i = len(self.words)
+            self.words.append(word)
+            self.deficits.append(deficit)
+            self.buckets[deficit].add(i)
+            for lt, count in counts.items():
+                for k in range(1, min(count, self.remaining[lt]) + 1):
+                    self._needing[lt][k].append(i)
+        self.update(pool)
+
+    def _move(self, ids, delta):
+        for i in ids:
+            deficit = self.deficits[i]
+            self.buckets[deficit].discard(i)
+            self.deficits[i] = deficit + delta
+            self.buckets[deficit + delta].add(i)
+
+    def update(self, pool):
+        """Catch up with the letters remaining in the pool."""
+        for lt in self.remaining:
+            have, now = self.remaining[lt], pool.remaining[lt]
+            # a word needing k of a letter lacks one more when fewer than k remain
+            while have > now:
+                self._move(self._needing[lt][have], 1)
+                have -= 1
+            while have < now:
+                have += 1
+                self._move(self._needing[lt][have], -1)
+            self.remaining[lt] = now
+
+    def spellable(self, num_blanks):
+        """Return the words spellable with the remaining letters and the given number of blanks."""
+        ids = set()
+        for deficit in range(num_blanks + 1):
+            ids.update(self.buckets.get(deficit, ()))
+        return [self.words[i] for i in sorted(ids)]
+
+
 def normalize_cmd(cmd):
     if cmd and cmd[0] == '/':
         splitted = cmd.split()
@@ -1,8 +1,12 @@
-from wordpal import puzzicon
-from collections import defaultdict
-from typing import Dict, Tuple, List, Set, Iterable, Callable
+from wordpal import puzzicon, countmatrix, snapshot
+from common import instrument, memory, multisets
+from collections import defaultdict, Counter, OrderedDict
+import bisect
+import hashlib
+from typing import Dict, Tuple, List, Set, Iterable, Callable, Optional
 import logging
 import itertools
+import heapq
 import sys
 
 
@@ -11,6 +15,10 @@ _ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
 _BLANKS = '?_.'
 _GARBAGE = ' '
 _DEFAULT_PENALTY = -50
+ENGINE_INDEX = 'index'
+ENGINE_MATRIX = 'matrix'
+ENGINES = (ENGINE_INDEX, ENGINE_MATRIX)
+_MATRIX_BATCH_SIZE = 256
 _LETTER_SOULS = {
     'A': 2, 'B': 3, 'C': 5, 'D': 7, 'E': 11, 
     'F': 13,  'G': 17, 'H': 19, 'I': 23, 'J': 29, 
@@ -25,35 +33,160 @@ def _NOOP(*args, **kwargs):
     pass
 
 
-def _to_flat_list(blah):
-    if isinstance(blah, str):
-        return list(blah)
-    else:
-        lists = [list(x) for x in blah]
-        master = []
-        for l in lists:
-            master += l
-        return master
+def _letters(word) -> str:
+    """Return the uppercase letters of a word or of a sequence of words."""
+    if not isinstance(word, str):
+        word = ''.join(word)
+    return word.upper()
+
+
+class PrimeSignature(object):
+    """Product of one prime per letter; unbounded in size."""
+
+    name = 'prime'
+
+    def of(self, word) -> int:
+        soul = 1
+        for ch in _letters(word):
+            soul *= _LETTER_SOULS[ch]
+        return soul
+
+    def combine(self, a: int, b: int) -> int:
+        return a * b
+
+
+class SortedSignature(object):
+    """Letters in sorted order."""
+
+    name = 'sorted'
+
+    def of(self, word) -> str:
+        return ''.join(sorted(_letters(word)))
+
+    def combine(self, a: str, b: str) -> str:
+        return ''.join(sorted(a + b))
+
+
+_PACKED_BITS = 5
+_PACKED_MAX = (1 << _PACKED_BITS) - 1
+_PACKED_UNITS = dict((ch, 1 << (_PACKED_BITS * i)) for i, ch in enumerate(_ALPHABET))
+_PACKED_CARRIES = sum(1 << (_PACKED_BITS * i) for i in range(1, len(_ALPHABET) + 1))
+
+
+class PackedSignature(object):
+    """Letter counts packed into 5-bit fields of one 130-bit integer.
+
+    No letter may occur more than 31 times in a word or phrase.
+    """
+
+    name = 'packed'
+
+    def of(self, word) -> int:
+        letters = _letters(word)
+        if len(letters) > _PACKED_MAX and max(map(letters.count, set(letters))) > _PACKED_MAX:
+            raise ValueError("too many repetitions of a letter for packed signature")
+        key = 0
+        for ch in letters:
+            key += _PACKED_UNITS[ch]
+        return key
+
+    def combine(self, a: int, b: int) -> int:
+        key = a + b
+        if (a ^ b ^ key) & _PACKED_CARRIES:
+            raise ValueError("too many repetitions of a letter for packed signature")
+        return key
+
+
+SIGNATURES = dict((signature.name, signature) for signature in (PrimeSignature(), SortedSignature(), PackedSignature()))
+_PRIME_SIGNATURE = SIGNATURES['prime']
 
 
 def compute_soul(word):
-    soul = 1
-    for ch in _to_flat_list(word):
-        ch = ch.upper()
-        p = _LETTER_SOULS[ch]
-        soul *= p
-    return soul
+    return _PRIME_SIGNATURE.of(word)
+
+
+def _fingerprint(h, obj, depth=0):
+    """Add a description of a function's code, defaults, closure and referenced globals to a hash.
+
+    Raise TypeError if the object is not a plain function, or references one
+    that is not, because such an object has no stable description.
+    """
+    code = getattr(obj, '__code__', None)
+    if code is None or depth > 4:
+        raise TypeError("cannot fingerprint {!r}".format(obj))
+    _fingerprint_code(h, code)
+    h.update(repr((obj.__defaults__, obj.__kwdefaults__)).encode('utf-8'))
+    for cell in obj.__closure__ or ():
+        _fingerprint_value(h, cell.cell_contents, depth)
+    for name in code.co_names:
+        if name in obj.__globals__:
+            h.update(name.encode('utf-8'))
+            _fingerprint_value(h, obj.__globals__[name], depth)
+
+
+def _fingerprint_code(h, code):
+    h.update(code.co_code)
+    for const in code.co_consts:
+        if hasattr(const, 'co_code'):
+            _fingerprint_code(h, const)
+        else:
+            h.update(repr(const).encode('utf-8'))
+    h.update(repr(code.co_names).encode('utf-8'))
+
+
+def _fingerprint_value(h, value, depth):
+    if hasattr(value, '__code__'):
+        _fingerprint(h, value, depth + 1)
+    elif isinstance(value, type(sys)):
+        h.update(value.__name__.encode('utf-8'))
+    elif isinstance(value, (str, bytes, int, float, bool, type(None), tuple, frozenset)):
+        h.update(repr(value).encode('utf-8'))
+    elif callable(value) and getattr(value, '__module__', None) == 'builtins':
+        h.update(value.__qualname__.encode('utf-8'))
+    else:
+        raise TypeError("cannot fingerprint {!r}".format(value))
+
+
+def _metrics_key(metrics) -> Optional[str]:
+    """Derive a key for a set of metrics, or return None if any of them cannot be fingerprinted."""
+    h = hashlib.sha1()
+    try:
+        for metric in metrics:
+            _fingerprint(h, metric)
+    except TypeError as e:
+        _log.debug("scores will not be persisted: %s", e)
+        return None
+    return 'custom-' + h.hexdigest()[:16]
 
 
 class Evaluator(object):
 
-    def __init__(self, metrics=None):
+    def __init__(self, metrics=None, key: str=None):
+        """Create an evaluator.
+
+        The key identifies the set of metrics wherever scores are cached.
+        It defaults to 'default' for the default metrics and otherwise to a
+        digest of the metrics' code, default arguments, closures and
+        referenced globals, computed on first use; it is None if a metric,
+        such as a partial or a callable object, cannot be digested, and
+        then scores are not persisted.
+        """
         if metrics is None:
             metrics = [
                 lambda rendering: "'" in rendering,
                 lambda rendering: rendering[0].upper() == rendering[0]
             ]
+            key = key or 'default'
         self.metrics = metrics
+        self._key = key
+        self._key_derived = key is not None
+
+    @property
+    def key(self) -> Optional[str]:
+        if not self._key_derived:
+            self._key = _metrics_key(self.metrics)
+            self._key_derived = True
+        return self._key
     
     def evaluate(self, puzzeme):
         aggregate = 0
@@ -68,37 +201,179 @@ class Evaluator(object):
         return aggregate
 
 
+def _parse_score(text: str):
+    try:
+        return int(text)
+    except ValueError:
+        return float(text)
+
+
+class ScoreIndex(object):
+    """Puzzemes sorted by Evaluator score, for slicing by threshold.
+
+    The puzzemes and scores given to the constructor must already be in
+    ascending order of score; use build() to score and sort them.
+    """
+
+    def __init__(self, puzzemes: List[puzzicon.Puzzeme], scores: List):
+        self.scores = scores
+        self.puzzemes = puzzemes
+
+    @classmethod
+    def build(cls, puzzemes: Iterable[puzzicon.Puzzeme], evaluator: Evaluator):
+        pairs = sorted(((evaluator.evaluate(p), p) for p in puzzemes), key=lambda pair: pair[0])
+        return ScoreIndex([p for _, p in pairs], [score for score, _ in pairs])
+
+    def at_least(self, threshold) -> List[puzzicon.Puzzeme]:
+        """Return the puzzemes scoring at or above the threshold."""
+        return self.puzzemes[bisect.bisect_left(self.scores, threshold):]
+
+    def score_dict(self) -> Dict[puzzicon.Puzzeme, int]:
+        return dict(zip(self.puzzemes, self.scores))
+
+
+_SCORE_INDEX_CACHE = OrderedDict()
+_SCORE_INDEX_CACHE_SIZE = 4
+
+
+def _load_score_index(source: str, key: str, count: int) -> Optional[ScoreIndex]:
+    columns = snapshot.load(source, ('canonical', 'rendering', 'order:' + key, 'score:' + key))
+    if columns is None:
+        return None
+    canonicals, renderings, order, scores = columns
+    if len(canonicals) != count:
+        _log.debug("snapshot of %s does not match puzzemes", source)
+        return None
+    rows = map(int, order)
+    puzzemes = [puzzicon.Puzzeme.restore(canonicals[i], renderings[i]) for i in rows]
+    return ScoreIndex(puzzemes, list(map(_parse_score, scores)))
+
+
+def _save_score_index(source: str, key: str, index: ScoreIndex):
+    columns = snapshot.load(source, ('canonical', 'rendering'))
+    if columns is None:
+        return
+    rows = {puzzicon.Puzzeme.restore(c, r): i for i, (c, r) in enumerate(zip(*columns))}
+    try:
+        order = [str(rows[p]) for p in index.puzzemes]
+    except KeyError:
+        _log.debug("snapshot rows of %s do not match puzzemes", source)
+        return
+    if len(order) == len(rows):
+        snapshot.add_columns(source, {'order:' + key: order, 'score:' + key: list(map(repr, index.scores))})
+
+
+def score_index(puzzemes, evaluator: Evaluator=None, source: str=None) -> ScoreIndex:
+    """Return the score index of a set of puzzemes.
+
+    If the puzzemes were read from the wordlist file named by source, the
+    index is kept in that file's snapshot, as the snapshot row numbers in
+    ascending order of score and the scores in the same order, and cached
+    in memory until the file changes. The puzzemes are assumed to be the
+    contents of the file as long as there are as many of them as there are
+    rows in the snapshot.
+    """
+    evaluator = evaluator or Evaluator()
+    key = evaluator.key
+    if source is None or key is None:
+        with instrument.timer('scores.evaluate'):
+            return ScoreIndex.build(puzzemes, evaluator)
+    try:
+        described = snapshot.describe_source(source, with_digest=False)
+    except OSError:
+        with instrument.timer('scores.evaluate'):
+            return ScoreIndex.build(puzzemes, evaluator)
+    cache_key = (key, described['path'], described['size'], described['mtime_ns'], len(puzzemes))
+    try:
+        _SCORE_INDEX_CACHE.move_to_end(cache_key)
+        instrument.count('scores.cache_hits')
+        return _SCORE_INDEX_CACHE[cache_key]
+    except KeyError:
+        pass
+    index = _load_score_index(source, key, len(puzzemes))
+    if index is not None:
+        instrument.count('scores.snapshot_hits')
+    else:
+        with instrument.timer('scores.evaluate'):
+            index = ScoreIndex.build(puzzemes, evaluator)
+        _save_score_index(source, key, index)
+    _SCORE_INDEX_CACHE[cache_key] = index
+    while len(_SCORE_INDEX_CACHE) > _SCORE_INDEX_CACHE_SIZE:
+        _SCORE_INDEX_CACHE.popitem(last=False)
+    return index
+
+
+def _extend_frontier(wordmap, frontier, canonicals, souls, signature, last=False):
+    """Add every sequence in the frontier extended by one word to the word map, and return the extensions.
+
+    On the last extension, nothing is returned, so that the extensions are
+    not kept alongside the word map.
+    """
+    combine = signature.combine
+    extensions = None if last else []
+    for ngram, soul in frontier:
+        for canonical, canonical_soul in zip(canonicals, souls):
+            newgram, newsoul = ngram + (canonical,), combine(soul, canonical_soul)
+            wordmap[newsoul].append(newgram)
+            if not last:
+                extensions.append((newgram, newsoul))
+    return extensions
+
+
 class Soothsayer(object):
 
-    def __init__(self, wordmap: Dict[int, List[Tuple[str, ...]]]):
+    def __init__(self, wordmap: Dict[int, List[Tuple[str, ...]]], signature: str='prime'):
         self.wordmap = wordmap
         assert isinstance(wordmap, dict), "wordmap must be a dictionary"
+        assert signature in SIGNATURES, "signature must be one of " + str(tuple(SIGNATURES))
+        self.signature = SIGNATURES[signature]
 
     @classmethod
-    def build(cls, canonicals: Iterable[str], nwords=1):
+    def build(cls, canonicals: Iterable[str], nwords=1, signature: str='prime'):
+        """Build a word map of all sequences of up to nwords canonicals.
+
+        The canonicals may be given as a PuzzemeTable. The word map is keyed by the named signature, one of SIGNATURES.
+        The signature of each sequence is computed from the signature of
+        its parent sequence.
+        """
+        assert signature in SIGNATURES, "signature must be one of " + str(tuple(SIGNATURES))
+        signer = SIGNATURES[signature]
+        if isinstance(canonicals, puzzicon.PuzzemeTable):
+            canonicals = canonicals.canonicals()
         assert nwords <= 3, "anagrams must be at most 3 words"
         _log.debug("building word map (max words %d)", nwords)
         wordmap = defaultdict(list)
         if nwords > 1:
             canonicals = list(canonicals)
+            memory.check_budget("word map of up to {} words from {} canonicals".format(nwords, len(canonicals)), cls.projected_size(len(canonicals), nwords))
+        souls = []
         for canonical in canonicals:
-            soul = compute_soul(canonical)
+            soul = signer.of(canonical)
+            souls.append(soul)
             wordmap[soul].append((canonical,))
         if nwords > 1:
-            for i in range(nwords - 1):
-                _log.debug("building dimension %d of word map", i + 2)
-                wordmap_values = list(wordmap.values())
-                for ngrams in wordmap_values:
-                    for ngram in ngrams:
-                        for canonical in canonicals:
-                            newgram = tuple(list(ngram) + [canonical])
-                            soul = compute_soul(newgram)
-                            wordmap[soul].append(newgram)
+            with instrument.timer('soothsayer.multiword'), memory.peak('soothsayer.multiword'):
+                frontier = [((canonical,), soul) for canonical, soul in zip(canonicals, souls)]
+                for i in range(nwords - 1):
+                    _log.debug("building dimension %d of word map", i + 2)
+                    frontier = _extend_frontier(wordmap, frontier, canonicals, souls, signer, last=i == nwords - 2)
         _log.debug("%d souls in word map", len(wordmap))
-        return Soothsayer(wordmap)
+        if memory.enabled():
+            memory.account('soothsayer.wordmap', wordmap, sum(map(len, wordmap.values())))
+        return Soothsayer(wordmap, signature)
+
+    @staticmethod
+    def projected_size(ncanonicals: int, nwords: int) -> int:
+        """Estimate the bytes needed to build a word map, which holds ncanonicals^k sequences of each length k."""
+        total = 0
+        for k in range(1, nwords + 1):
+            # list slot, sequence tuple, and the (sequence, signature) pair held in the build frontier
+            per_entry = 8 + sys.getsizeof((None,) * k) + sys.getsizeof((None, None)) + 32
+            total += ncanonicals ** k * per_entry
+        return total
     
     def lookup(self, word: str) -> Set[Tuple[str, ...]]:
-        soul = compute_soul(word)
+        soul = self.signature.of(word)
         try:
             return frozenset(self.wordmap[soul])
         except KeyError:  # allow for regular Dict in constructor
@@ -111,6 +386,129 @@ class Soothsayer(object):
                 yield ' '.join(ngram)
 
 
+class Diviner(object):
+    """Multi-word anagram engine that stores only single-word data.
+
+    Phrases are found at lookup time by recursively dividing the soul of
+    the query by the souls of words that divide it, so no N^k word map is
+    materialized. Results match those of a Soothsayer built with the same
+    canonicals and number of words. If ordered is false, each combination
+    of words is returned once, in sorted order, instead of once per
+    permutation.
+    """
+
+    def __init__(self, soulmap: Dict[int, Tuple[str, ...]], nwords: int=1, ordered: bool=True):
+        assert isinstance(soulmap, dict), "soulmap must be a dictionary"
+        assert nwords > 0, "anagrams must be at least 1 word"
+        self.soulmap = soulmap
+        self.nwords = nwords
+        self.ordered = ordered
+        self.souls = sorted(soulmap.keys())
+
+    @classmethod
+    def build(cls, canonicals: Iterable[str], nwords=1, ordered=True):
+        soulmap = defaultdict(list)
+        for canonical in canonicals:
+            soulmap[compute_soul(canonical)].append(canonical)
+        soulmap = dict((soul, tuple(words)) for soul, words in soulmap.items())
+        _log.debug("%d souls in soul map (max words %d)", len(soulmap), nwords)
+        return Diviner(soulmap, nwords, ordered)
+
+    def _partitions(self, remainder: int, candidates: List[int], start: int, depth: int):
+        """Yield lists of souls, in nondecreasing order, whose product is the remainder."""
+        for i in range(start, len(candidates)):
+            soul = candidates[i]
+            if soul > remainder:
+                break
+            if remainder % soul != 0:
+                continue
+            quotient = remainder // soul
+            if quotient == 1:
+                yield [soul]
+            elif depth > 1:
+                for tail in self._partitions(quotient, candidates, i, depth - 1):
+                    yield [soul] + tail
+
+    def _expand(self, partition: List[int]):
+        wordlists = [self.soulmap[soul] for soul in partition]
+        for combo in itertools.product(*wordlists):
+            if self.ordered:
+                for perm in itertools.permutations(combo):
+                    yield perm
+            else:
+                yield tuple(sorted(combo))
+
+    def lookup(self, word: str) -> Set[Tuple[str, ...]]:
+        target = compute_soul(word)
+        if target == 1:
+            return frozenset()
+        candidates = [soul for soul in self.souls if target % soul == 0]
+        answers = set()
+        for partition in self._partitions(target, candidates, 0, self.nwords):
+            answers.update(self._expand(partition))
+        return frozenset(answers)
+
+
+class Concordance(object):
+    """Index of words by length and letter multiset.
+
+    Templates with blanks are resolved by scanning the multisets of the
+    template's length for those that contain the known letters and whose
+    surplus letters can be drawn from the blank pools, instead of looking
+    up every possible filling of the blanks.
+    """
+
+    def __init__(self, buckets: Dict[int, Dict[str, Tuple[str, ...]]]):
+        assert isinstance(buckets, dict), "buckets must be a dictionary"
+        self.buckets = buckets
+        self.masks = {}
+        for length, bucket in buckets.items():
+            self.masks[length] = [(puzzicon.letter_mask(key), key) for key in bucket]
+
+    @classmethod
+    def build(cls, canonicals: Iterable[str]):
+        buckets = defaultdict(lambda: defaultdict(list))
+        for canonical in canonicals:
+            buckets[len(canonical)][''.join(sorted(canonical))].append(canonical)
+        buckets = dict((length, dict((key, tuple(words)) for key, words in bucket.items())) for length, bucket in buckets.items())
+        _log.debug("%d word lengths in concordance", len(buckets))
+        return Concordance(buckets)
+
+    def _keys(self, template):
+        known = ''.join(template.known_pool)
+        if not template.unknown_pools:
+            key = ''.join(sorted(known))
+            if key in self.buckets.get(template.length, {}):
+                yield key
+            return
+        known_counts = Counter(known)
+        known_mask = puzzicon.letter_mask(known)
+        pools = [set(pool) for pool in template.unknown_pools]
+        unrestricted = all(pool.issuperset(_ALPHABET) for pool in pools)
+        for mask, key in self.masks.get(template.length, ()):
+            if mask & known_mask != known_mask:
+                continue
+            if any(key.count(letter) < n for letter, n in known_counts.items()):
+                continue
+            if not unrestricted:
+                surplus = list((Counter(key) - known_counts).elements())
+                if not multisets.can_draw(surplus, pools):
+                    continue
+            yield key
+
+    def iterate(self, template):
+        """Yield, as sets of 1-tuples, the words that fill the template, one letter multiset at a time."""
+        for key in self._keys(template):
+            yield set((word,) for word in self.buckets[template.length][key])
+
+    def resolve(self, template) -> Set[Tuple[str, ...]]:
+        """Return the set of 1-tuples of words that fill the template."""
+        answers = set()
+        for words in self.iterate(template):
+            answers.update(words)
+        return frozenset(answers)
+
+
 class Template(object):
 
     def __init__(self, known_pool, unknown_pools):
@@ -130,6 +528,26 @@ class Template(object):
             _log.debug("yielding %s + %s", self.known_pool, blankproduct)
             combo = ''.join(self.known_pool) + ''.join(blankproduct)
             yield combo
+
+    def iterate_multisets(self):
+        """Yield the possibles whose letter multisets are distinct.
+
+        Each possible is yielded with its blanks in sorted order, so
+        permutations of the same filling are skipped.
+        """
+        groups = defaultdict(int)
+        for pool in self.unknown_pools:
+            groups[''.join(sorted(set(pool)))] += 1
+        choices = [itertools.combinations_with_replacement(pool, n) for pool, n in groups.items()]
+        known = ''.join(self.known_pool)
+        seen = set()
+        for product in itertools.product(*choices):
+            filling = ''.join(sorted(itertools.chain(*product)))
+            if len(groups) > 1:
+                if filling in seen:
+                    continue
+                seen.add(filling)
+            yield known + filling
     
     def count_unknown_combos(self):
         product = 1
@@ -169,38 +587,152 @@ class Template(object):
         return len(self.known_pool) == 0 and len(self.unknown_pools) == 0
 
 
-def do_lookups(provided: str, dictionary=None, callback:Callable=None, puzzeme_threshold:int=None, max_words:int=1):
-    callback = callback or _NOOP
-    template = Template.create(provided)
-    found = set()
-    if template.empty():
-        _log.warn("no valid letters provided")
-        return found
+def load_puzzemes(dictionary=None):
+    """Load puzzemes from a wordlist pathname, '-' for standard input, an existing set, or the default wordlist."""
     if dictionary is None:
-        puzzemes = puzzicon.load_default_puzzemes()
-    elif isinstance(dictionary, set):
-        puzzemes = dictionary
-    else:
-        if dictionary == '-':
-            puzzemes = puzzicon.create_puzzeme_set(sys.stdin)
-        else:
-            puzzemes = puzzicon.read_puzzeme_set(dictionary)
-    if puzzeme_threshold is not None:
-        evaluator = Evaluator()
-        puzzemes = filter(lambda p: evaluator.evaluate(p) >= puzzeme_threshold, puzzemes)
+        return puzzicon.load_default_puzzemes()
+    if isinstance(dictionary, (set, frozenset)):
+        return dictionary
+    if dictionary == '-':
+        return puzzicon.create_puzzeme_set(sys.stdin)
+    return puzzicon.read_puzzeme_set(dictionary)
+
+
+def wordlist_source(dictionary=None):
+    """Return the pathname of the wordlist file a dictionary argument names, if any."""
+    if dictionary is None:
+        return puzzicon.DEFAULT_WORDLIST
+    if isinstance(dictionary, str) and dictionary != '-':
+        return dictionary
+    return None
+
+
+def select_puzzemes(puzzemes, puzzeme_threshold:int=None, source:str=None):
+    if puzzeme_threshold is None:
+        return puzzemes
+    return score_index(puzzemes, source=source).at_least(puzzeme_threshold)
+
+
+def build_oracle(puzzemes, max_words:int=1, ordered:bool=True, engine:str=ENGINE_INDEX):
+    """Build the structure that answers lookups for the given options."""
     canonicals = map(lambda p: p.canonical, puzzemes)
-    soothsayer = Soothsayer.build(canonicals, nwords=max_words)
+    with instrument.timer('oracle.build'), memory.peak('oracle.build'):
+        if max_words > 1:
+            oracle = Diviner.build(canonicals, nwords=max_words, ordered=ordered)
+        elif engine == ENGINE_MATRIX:
+            oracle = countmatrix.LetterCountMatrix(canonicals)
+        else:
+            oracle = Concordance.build(canonicals)
+    memory.account('oracle', oracle)
+    return oracle
+
+
+def iterate_answer_sets(oracle, template: Template):
+    """Yield sets of answer tuples from an oracle for the possibles of a template."""
+    if isinstance(oracle, Concordance):
+        yield from oracle.iterate(template)
+    elif countmatrix.available() and isinstance(oracle, countmatrix.LetterCountMatrix):
+        possibles = template.iterate_multisets()
+        batch = list(itertools.islice(possibles, _MATRIX_BATCH_SIZE))
+        while batch:
+            for words in oracle.anagrams(batch):
+                yield set((word,) for word in words)
+            batch = list(itertools.islice(possibles, _MATRIX_BATCH_SIZE))
+    else:
+        for word in template.iterate_multisets():
+            yield oracle.lookup(word)
+
+
+def find_answers(template: Template, oracle):
+    """Yield each distinct answer, with words joined by spaces."""
+    found = set()
     nlookups, ndupes = 0, 0
-    for word in template.iterate_possibles():
-        nlookups += 1
-        answers = soothsayer.lookup(word)  # a set of tuples
-        for answer in answers:   # answer is a tuple of strings
-            joined = ' '.join(answer)
-            if joined not in found:
-                found.add(joined)
-                print(joined)
-            else:
-                _log.debug("duplicate %s", joined)
-                ndupes += 1
-    _log.debug("%d words found out of %d lookups (%d duplicates)", len(found), nlookups, ndupes)
+    try:
+        for answers in iterate_answer_sets(oracle, template):  # each a set of tuples
+            nlookups += 1
+            for answer in answers:   # answer is a tuple of strings
+                joined = ' '.join(answer)
+                if joined not in found:
+                    found.add(joined)
+                    yield joined
+                else:
+                    ndupes += 1
+    finally:
+        instrument.count('lookups', nlookups)
+        instrument.count('hits', len(found))
+        instrument.count('duplicates', ndupes)
+        _log.debug("%d words found out of %d lookups (%d duplicates)", len(found), nlookups, ndupes)
+
+
+def rank_answers(answers: Iterable[str], puzzemes, k: int, evaluator: Evaluator=None) -> List[str]:
+    """Return the k answers with the highest Evaluator scores, best first.
+
+    The score of an answer is the sum of the scores of its words, where the
+    score of a word is the best score among puzzemes with that canonical
+    form. Ties are broken alphabetically. A bounded heap is used, so the
+    answers are never sorted all together.
+    """
+    evaluator = evaluator or Evaluator()
+    by_canonical = defaultdict(list)
+    for p in puzzemes:
+        by_canonical[p.canonical].append(p)
+    scores = {}
+    def _score(answer):
+        total = 0
+        for canonical in answer.split():
+            if canonical not in scores:
+                scores[canonical] = max(evaluator.evaluate(p) for p in by_canonical[canonical])
+            total += scores[canonical]
+        return total
+    return heapq.nsmallest(k, answers, key=lambda answer: (-_score(answer), answer))
+
+
+def _prepare(provided: str, dictionary, puzzeme_threshold: int):
+    template = Template.create(provided)
+    if template.empty():
+        _log.warning("no valid letters provided")
+        return template, None
+    puzzemes = load_puzzemes(dictionary)
+    return template, list(select_puzzemes(puzzemes, puzzeme_threshold, wordlist_source(dictionary)))
+
+
+def iterate_lookups(provided: str, dictionary=None, puzzeme_threshold:int=None, max_words:int=1, ordered:bool=True, engine:str=ENGINE_INDEX, limit:int=None):
+    """Yield distinct answers lazily.
+
+    If limit is given, stop after that many answers, without expanding
+    the rest of the template.
+    """
+    template, puzzemes = _prepare(provided, dictionary, puzzeme_threshold)
+    if puzzemes is None:
+        return
+    answers = find_answers(template, build_oracle(puzzemes, max_words, ordered, engine))
+    if limit is not None:
+        answers = itertools.islice(answers, limit)
+    yield from answers
+
+
+def top_lookups(provided: str, top: int, dictionary=None, puzzeme_threshold:int=None, max_words:int=1, ordered:bool=True, engine:str=ENGINE_INDEX) -> List[str]:
+    """Return the top answers by Evaluator score, best first."""
+    template, puzzemes = _prepare(provided, dictionary, puzzeme_threshold)
+    if puzzemes is None:
+        return []
+    answers = find_answers(template, build_oracle(puzzemes, max_words, ordered, engine))
+    return rank_answers(answers, puzzemes, top)
+
+
+def do_lookups(provided: str, dictionary=None, callback:Callable=None, puzzeme_threshold:int=None, max_words:int=1, ordered:bool=True, engine:str=ENGINE_INDEX, limit:int=None, top:int=None):
+    """Pass each answer to the callback and return the set of answers.
+
+    With top, only the best answers are passed, best first; with a limit
+    too, at most the limit of them.
+    """
+    callback = callback or _NOOP
+    found = set()
+    if top is not None:
+        answers = top_lookups(provided, top if limit is None else min(top, limit), dictionary, puzzeme_threshold, max_words, ordered, engine)
+    else:
+        answers = iterate_lookups(provided, dictionary, puzzeme_threshold, max_words, ordered, engine, limit)
+    for joined in answers:
+        found.add(joined)
+        callback(joined)
     return found
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""Resident anagram query service.
+
+The dictionary is loaded once and each lookup structure is built once per
+combination of options, so that many queries can be answered without
+paying the build cost again. Queries and responses are newline-delimited
+JSON objects, e.g.
+
+    {"id": 1, "letters": "ab?", "max_words": 2, "threshold": -10}
+    {"id": 1, "answers": ["..."], "elapsed_ms": 0.8}
+
+Options missing from a query take the service defaults.
+"""
+
+import os
+import sys
+import stat
+import errno
+import socket
+import json
+import time
+import logging
+import threading
+import socketserver
+from collections import OrderedDict
+from typing import Dict, IO
+from wordpal import countmatrix
+from . import lookup
+
+_log = logging.getLogger(__name__)
+DEFAULT_MAX_ORACLES = 8
+
+
+class AnagramService(object):
+
+    def __init__(self, puzzemes, max_words: int=1, puzzeme_threshold: int=None, ordered: bool=True, engine: str=lookup.ENGINE_INDEX, source: str=None, max_oracles: int=DEFAULT_MAX_ORACLES):
+        self.puzzemes = frozenset(puzzemes)
+        self.source = source
+        self.defaults = {
+            'max_words': max_words,
+            'threshold': puzzeme_threshold,
+            'ordered': ordered,
+            'engine': engine,
+        }
+        self.max_oracles = max_oracles
+        self.oracles = OrderedDict()
+        self._lock = threading.Lock()
+        self._building = {}
+
+    def _cached_oracle(self, key):
+        with self._lock:
+            oracle = self.oracles.get(key)
+            if oracle is not None:
+                self.oracles.move_to_end(key)
+            return oracle
+
+    def oracle(self, max_words: int, threshold: int, ordered: bool, engine: str):
+        """Return the oracle for the given options, building it on first use.
+
+        At most max_oracles oracles are kept, least recently used first out.
+        An oracle is built holding a lock for its options only, so queries
+        with other options are not held up.
+        """
+        key = (max_words, threshold, ordered if max_words > 1 else True, engine if max_words == 1 else None)
+        oracle = self._cached_oracle(key)
+        if oracle is not None:
+            return oracle
+        with self._lock:
+            building = self._building.setdefault(key, threading.Lock())
+        with building:
+            oracle = self._cached_oracle(key)
+            if oracle is not None:
+                return oracle
+            start = time.perf_counter()
+            puzzemes = lookup.select_puzzemes(self.puzzemes, threshold, self.source)
+            oracle = lookup.build_oracle(puzzemes, max_words, ordered, engine)
+            _log.info("built oracle for %s in %.1f ms", key, (time.perf_counter() - start) * 1000)
+            with self._lock:
+                self.oracles[key] = oracle
+                while len(self.oracles) > self.max_oracles:
+                    self.oracles.popitem(last=False)
+                self._building.pop(key, None)
+            return oracle
+
+    def answer(self, query: Dict) -> Dict:
+        start = time.perf_counter()
+        options = dict(self.defaults)
+        options.update((k, query[k]) for k in self.defaults if k in query)
+        letters = query.get('letters', query.get('template'))
+        if not isinstance(letters, str):
+            raise ValueError("query must have a 'letters' string")
+        if not isinstance(options['max_words'], int) or options['max_words'] < 1:
+            raise ValueError("max_words must be a positive integer")
+        if options['threshold'] is not None and (isinstance(options['threshold'], bool) or not isinstance(options['threshold'], (int, float))):
+            raise ValueError("threshold must be a number")
+        if options['engine'] not in lookup.ENGINES:
+            raise ValueError("engine must be one of " + str(lookup.ENGINES))
+        if options['engine'] == lookup.ENGINE_MATRIX and not countmatrix.available():
+            raise ValueError("engine 'matrix' requires numpy, which is not installed")
+        template = lookup.Template.create(letters)
+        answers = []
+        if not template.empty():
+            oracle = self.oracle(options['max_words'], options['threshold'], options['ordered'], options['engine'])
+            answers = sorted(lookup.find_answers(template, oracle))
+        return {
+            'id': query.get('id'),
+            'answers': answers,
+            'elapsed_ms': (time.perf_counter() - start) * 1000,
+        }
+
+    def handle_line(self, line: str) -> str:
+        """Answer one line of JSON with one line of JSON."""
+        query = {}
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError("query must be a JSON object")
+            response = self.answer(query)
+        except Exception as e:
+            _log.debug("query failed: %s", line, exc_info=True)
+            response = {'id': query.get('id') if isinstance(query, dict) else None, 'error': str(e)}
+        return json.dumps(response)
+
+    def serve_stream(self, ifile: IO[str], ofile: IO[str]):
+        for line in ifile:
+            if line.strip():
+                print(self.handle_line(line), file=ofile, flush=True)
+
+
+def _create_handler(service: AnagramService):
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                line = line.decode('utf-8')
+                if line.strip():
+                    self.wfile.write((service.handle_line(line) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+    return _Handler
+
+
+class _ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class _ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def _remove_stale_socket(pathname: str):
+    """Remove a socket left behind by a server that is no longer running.
+
+    The socket is probed with a connection first; it is removed only if
+    the connection is refused. Raise FileExistsError if the file is not a
+    socket and OSError (EADDRINUSE) if a server is listening on it.
+    """
+    if not os.path.lexists(pathname):
+        return
+    if not stat.S_ISSOCK(os.lstat(pathname).st_mode):
+        raise FileExistsError("{} exists and is not a socket".format(pathname))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+        try:
+            probe.connect(pathname)
+        except ConnectionRefusedError:
+            _log.info("removing stale socket %s", pathname)
+            os.unlink(pathname)
+            return
+    raise OSError(errno.EADDRINUSE, "a server is already listening on this socket", pathname)
+
+
+def serve_unix(service: AnagramService, pathname: str):
+    """Serve queries on a Unix socket, replacing a stale socket but no other kind of file."""
+    _remove_stale_socket(pathname)
+    with _ThreadingUnixStreamServer(pathname, _create_handler(service)) as server:
+        _log.info("serving on unix socket %s", pathname)
+        try:
+            server.serve_forever()
+        finally:
+            os.unlink(pathname)
+
+
+def serve_tcp(service: AnagramService, host: str, port: int):
+    with _ThreadingTCPServer((host, port), _create_handler(service)) as server:
+        _log.info("serving on %s:%d", *server.server_address[:2])
+        server.serve_forever()
+
+
+def serve(service: AnagramService, socket_path: str=None, port: int=None, host: str='127.0.0.1'):
+    """Serve queries on a Unix socket, a local TCP port, or standard input."""
+    if socket_path:
+        serve_unix(service, socket_path)
+    elif port is not None:
+        serve_tcp(service, host, port)
+    else:
+        service.serve_stream(sys.stdin, sys.stdout)
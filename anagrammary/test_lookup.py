@@ -1,6 +1,11 @@
+import os
+import functools
+import tempfile
 import unittest
+import unittest.mock
 from anagrammary import lookup
 from wordpal.puzzicon import Puzzeme
+from wordpal import countmatrix, snapshot
 import logging
 import common.testing
 import itertools
@@ -61,6 +66,36 @@ class TestSoothsayer(unittest.TestCase):
         self.assertSetEqual(set(expected), set(actual))
 
 
+    def test_build_3words_no_duplicates(self):
+        s = lookup.Soothsayer.build(['A', 'B'], nwords=3)
+        values = list(s.values())
+        self.assertEqual(2 + 4 + 8, len(values))
+        self.assertEqual(len(values), len(set(values)))
+
+    def test_signatures(self):
+        canonicals = ['BOOK', 'WORM', 'BOOKWORM', 'FOO', 'BAR', 'REASON', 'ARE', 'SON', 'A']
+        queries = ['', 'WBOOROMK', 'reason', 'AA', 'OOF', 'ZZZ']
+        for nwords in (1, 2, 3):
+            expected = lookup.Soothsayer.build(canonicals, nwords=nwords)
+            for name in lookup.SIGNATURES:
+                s = lookup.Soothsayer.build(canonicals, nwords=nwords, signature=name)
+                for query in queries:
+                    with self.subTest(nwords=nwords, signature=name, query=query):
+                        self.assertSetEqual(expected.lookup(query), s.lookup(query))
+
+    def test_signature_combine(self):
+        for name, signature in lookup.SIGNATURES.items():
+            with self.subTest(signature=name):
+                self.assertEqual(signature.of('BOOKWORM'), signature.combine(signature.of('BOOK'), signature.of('WORM')))
+                self.assertEqual(signature.of(('BOOK', 'WORM')), signature.of('WORMBOOK'))
+
+    def test_packed_overflow(self):
+        signature = lookup.SIGNATURES['packed']
+        self.assertRaises(ValueError, signature.of, 'A' * 32)
+        self.assertRaises(ValueError, signature.combine, signature.of('A' * 31), signature.of('A'))
+        self.assertEqual(signature.of('A' * 31 + 'B'), signature.combine(signature.of('A' * 31), signature.of('B')))
+
+
 class TestTemplate(unittest.TestCase):
 
     def test_create(self):
@@ -81,22 +116,87 @@ class TestTemplate(unittest.TestCase):
         actual = list(template.iterate_possibles())
         self.assertListEqual(['ABCDEF'], actual)
     
+    def test_iterate_multisets(self):
+        template = lookup.Template.create("AB??[XY]")
+        actual = list(template.iterate_multisets())
+        self.assertEqual(len(actual), len(set(''.join(sorted(p)) for p in actual)))
+        expected = set(''.join(sorted(p)) for p in template.iterate_possibles())
+        self.assertSetEqual(expected, set(''.join(sorted(p)) for p in actual))
+
     def test_create_garbage(self):
         template = lookup.Template.create('S G S E')
         self.assertTupleEqual(template.known_pool, ('s', 'G', 'S', 'E',))
 
 
+class TestConcordance(unittest.TestCase):
+
+    def test_resolve_same_as_expansion(self):
+        canonicals = ['SHALE', 'HEALS', 'HEELS', 'LEASH', 'HALEST', 'THEIR', 'THERE', 'WHERE', 'HERE', 'HEX', 'HAS', 'SHE']
+        soothsayer = lookup.Soothsayer.build(canonicals)
+        concordance = lookup.Concordance.build(canonicals)
+        for provided in ['ALESH', 'HE?', '?E?', 'H[AE]S', '[XS][AH]E', 'HE[LR]?S', '???', 'Q??', 'ERE?', '[SH]?A?E', 'THEIRS']:
+            template = lookup.Template.create(provided)
+            expected = set()
+            for word in template.iterate_possibles():
+                expected.update(soothsayer.lookup(word))
+            with self.subTest(provided=provided):
+                self.assertSetEqual(expected, concordance.resolve(template))
+
+
+class TestScoreIndex(unittest.TestCase):
+
+    def test_at_least(self):
+        puzzemes = [Puzzeme('foo'), Puzzeme('Bar'), Puzzeme('baz')]
+        index = lookup.ScoreIndex.build(puzzemes, lookup.Evaluator())
+        self.assertSetEqual({'foo', 'baz'}, set(p.rendering for p in index.at_least(-10)))
+        self.assertEqual(3, len(index.at_least(-50)))
+        self.assertEqual(0, len(index.at_least(1)))
+
+    def test_evaluator_keys(self):
+        self.assertEqual('default', lookup.Evaluator().key)
+        a = lookup.Evaluator([lambda r: len(r) > 3])
+        b = lookup.Evaluator([lambda r: len(r) > 4])
+        self.assertNotEqual(a.key, b.key)
+        self.assertNotEqual('default', a.key)
+        self.assertEqual(a.key, lookup.Evaluator([lambda r: len(r) > 3]).key)
+        self.assertEqual('mine', lookup.Evaluator([len], key='mine').key)
+        self.assertNotEqual(lookup.Evaluator([lambda r, n=3: len(r) > n]).key, lookup.Evaluator([lambda r, n=10: len(r) > n]).key)
+        self.assertIsNone(lookup.Evaluator([functools.partial(max, 1)]).key)
+        self.assertIsNone(lookup.Evaluator([len]).key)
+
+    def test_evaluator_key_globals(self):
+        global _THRESHOLD
+        metric = lambda r: len(r) > _THRESHOLD
+        _THRESHOLD = 3
+        a = lookup.Evaluator([metric]).key
+        _THRESHOLD = 4
+        self.assertNotEqual(a, lookup.Evaluator([metric]).key)
+
+    def test_score_index_unkeyed(self):
+        puzzemes = [Puzzeme('ab'), Puzzeme('abc')]
+        evaluator = lookup.Evaluator([functools.partial(lambda n, r: len(r) > n, 2)])
+        index = lookup.score_index(puzzemes, evaluator, source='/nonexistent')
+        self.assertListEqual([lookup._DEFAULT_PENALTY, 0], index.scores)
+
+    def test_score_index_persisted(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            source = os.path.join(tempdir, 'words')
+            with open(source, 'w') as ofile:
+                ofile.write("foo\nBar\nbaz\n")
+            with unittest.mock.patch.dict(os.environ, {'PUZZICON_SNAPSHOT_DIR': os.path.join(tempdir, 'snapshots')}):
+                puzzemes = lookup.load_puzzemes(source)
+                expected = set(lookup.select_puzzemes(puzzemes, -10, source))
+                self.assertSetEqual({'FOO', 'BAZ'}, set(p.canonical for p in expected))
+                self.assertIsNotNone(snapshot.load(source, ('order:default', 'score:default')))
+                lookup._SCORE_INDEX_CACHE.clear()
+                with unittest.mock.patch.object(lookup.Evaluator, 'evaluate', side_effect=AssertionError("scores should be loaded")):
+                    self.assertSetEqual(expected, set(lookup.select_puzzemes(lookup.load_puzzemes(source), -10, source)))
+                others = [Puzzeme('qux'), Puzzeme('Quux')]
+                self.assertSetEqual({'QUX'}, set(p.canonical for p in lookup.select_puzzemes(others, -10, source)))
+
+
 class TestModule(unittest.TestCase):
 
-    def test__to_flat_list(self):
-        test_cases = {
-            'abc': ['a', 'b', 'c'],
-            ('ab', 'cd', 'e'): ['a', 'b', 'c', 'd', 'e']
-        }
-        for arg, expected in test_cases.items():
-            with self.subTest():
-                self.assertListEqual(expected, lookup._to_flat_list(arg))
-    
     def test_do_lookups_2words(self):
         provided = 'RNEOAS'
         puzzemes = set([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('reason'), Puzzeme('are'), Puzzeme('son')])
@@ -105,3 +205,71 @@ class TestModule(unittest.TestCase):
         expected = set(['REASON', 'ARE SON', 'SON ARE'])
         self.assertSetEqual(expected, found)
 
+    def test_do_lookups_blanks(self):
+        puzzemes = set([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('reason'), Puzzeme('are'), Puzzeme('son')])
+        self.assertSetEqual(set(['BAR', 'ARE']), lookup.do_lookups('AR?', puzzemes))
+        self.assertSetEqual(set(['REASON', 'ARE SON', 'SON ARE']), lookup.do_lookups('RNE?AS', puzzemes, max_words=2))
+
+    def test_do_lookups_callback(self):
+        puzzemes = set([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('reason'), Puzzeme('are'), Puzzeme('son')])
+        received = []
+        found = lookup.do_lookups('RNEOAS', puzzemes, received.append, max_words=2)
+        self.assertSetEqual(found, set(received))
+        self.assertEqual(3, len(received))
+
+    def test_iterate_lookups_limit(self):
+        puzzemes = set(Puzzeme(w) for w in ['ab', 'ba', 'ac', 'ca', 'bc', 'cb'])
+        self.assertEqual(2, len(list(lookup.iterate_lookups('??', puzzemes, limit=2))))
+        self.assertEqual(6, len(list(lookup.iterate_lookups('??', puzzemes))))
+        self.assertListEqual([], list(lookup.iterate_lookups('', puzzemes)))
+
+    def test_iterate_lookups_lazy(self):
+        template = lookup.Template.create('??')
+        expansions = []
+        class _Oracle(object):
+            def lookup(self, word):
+                expansions.append(word)
+                return set([(word,)])
+        answers = lookup.find_answers(template, _Oracle())
+        self.assertEqual(3, len(list(itertools.islice(answers, 3))))
+        self.assertEqual(3, len(expansions))
+
+    def test_top_lookups(self):
+        puzzemes = set([Puzzeme('Bar'), Puzzeme('bra'), Puzzeme('Rab'), Puzzeme('rab'), Puzzeme('abr')])
+        self.assertListEqual(['ABR', 'BRA'], lookup.top_lookups('RAB', 2, puzzemes))
+        self.assertListEqual(['ABR', 'BRA', 'RAB', 'BAR'], lookup.top_lookups('RAB', 10, puzzemes))
+        received = []
+        lookup.do_lookups('RAB', puzzemes, received.append, top=1)
+        self.assertListEqual(['ABR'], received)
+        self.assertSetEqual({'ABR', 'BRA'}, lookup.do_lookups('RAB', puzzemes, top=3, limit=2))
+
+    @unittest.skipUnless(countmatrix.available(), "numpy is not installed")
+    def test_do_lookups_matrix(self):
+        puzzemes = set([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('reason'), Puzzeme('are'), Puzzeme('son')])
+        self.assertSetEqual(set(['BAR', 'ARE']), lookup.do_lookups('AR?', puzzemes, engine=lookup.ENGINE_MATRIX))
+        self.assertSetEqual(set(['REASON']), lookup.do_lookups('RNEOAS', puzzemes, engine=lookup.ENGINE_MATRIX))
+
+
+class TestDiviner(unittest.TestCase):
+
+    def test_lookup_same_as_soothsayer(self):
+        canonicals = ['BOOK', 'WORM', 'BOOKWORM', 'FOO', 'BAR', 'REASON', 'ARE', 'SON', 'A', 'B', 'O', 'OO']
+        queries = ['', 'WBOOROMK', 'REASON', 'AB', 'AA', 'BAA', 'OFO', 'OOOO', 'ZEBRA', 'BARFOO', 'ABOO']
+        for nwords in (1, 2, 3):
+            soothsayer = lookup.Soothsayer.build(canonicals, nwords=nwords)
+            diviner = lookup.Diviner.build(canonicals, nwords=nwords)
+            for query in queries:
+                with self.subTest(nwords=nwords, query=query):
+                    self.assertSetEqual(soothsayer.lookup(query), diviner.lookup(query))
+
+    def test_lookup_unordered(self):
+        d = lookup.Diviner.build(['BOOK', 'WORM', 'BOOKWORM', 'FOO', 'BAR'], nwords=2, ordered=False)
+        self.assertSetEqual(set([('BOOKWORM',), ('BOOK', 'WORM')]), d.lookup('WBOOROMK'))
+
+    def test_lookup_unordered_repeated(self):
+        d = lookup.Diviner.build(['A', 'B'], nwords=3, ordered=False)
+        self.assertSetEqual(set([('A', 'A', 'B')]), d.lookup('ABA'))
+
+    def test_lookup_4words(self):
+        d = lookup.Diviner.build(['A', 'B'], nwords=4, ordered=False)
+        self.assertSetEqual(set([('A', 'A', 'B', 'B')]), d.lookup('ABAB'))
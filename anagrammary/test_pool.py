@@ -0,0 +1,110 @@
+import random
+import itertools
+import unittest
+from collections import Counter
+import anagrammary
+from anagrammary import LetterPool, SpellableWords
+import common.testing
+
+common.testing.configure_logging()
+
+_WORDS = ('CAT', 'TEA', 'EAT', 'SEAT', 'TEASE', 'SET', 'A', 'CASES', 'TASTE', 'CASE')
+
+
+def _spellable(words, pool):
+    spellable = []
+    for word in words:
+        deficit = sum(max(0, count - pool.remaining[lt]) for lt, count in Counter(word).items())
+        if deficit <= pool.num_blanks:
+            spellable.append(word)
+    return sorted(spellable)
+
+
+class TestLetterPool(unittest.TestCase):
+
+    def test_consume(self):
+        pool = LetterPool.build('tease_')
+        pool.consume('TEC')
+        self.assertEqual('A S E ', pool.render())
+        self.assertListEqual(['T', 'E', 'C'], pool.used)
+        pool.consume('X')
+        self.assertListEqual(['T', 'E', 'C'], pool.used)
+        pool.consume('E')
+        self.assertListEqual(['A', 'S'], pool.get_unused())
+
+    def test_undo(self):
+        pool = LetterPool.build('aab_')
+        pool.consume('AAAB')
+        self.assertEqual(0, pool.num_blanks)
+        self.assertListEqual(['B', 'A'], pool.undo(2))
+        self.assertEqual(1, pool.num_blanks)
+        self.assertListEqual(['B'], pool.get_unused())
+        self.assertListEqual(['A'], pool.undo())
+        self.assertListEqual(['A', 'B'], pool.get_unused())
+        pool.undo(10)
+        self.assertEqual('A A B ?', pool.render())
+
+    def test_shuffled_distinct(self):
+        pool = LetterPool.build('aabbc')
+        self.assertEqual(30, pool.count_shuffled())
+        shuffles = list(pool.iterate_shuffled(100, rng=random.Random(1)))
+        self.assertSetEqual(set(itertools.permutations('AABBC')), set(shuffles))
+        self.assertEqual(30, len(shuffles))
+        self.assertEqual(10, len(pool.get_shuffled(10)))
+        pool.consume('AAB')
+        self.assertSetEqual({('B', 'C'), ('C', 'B')}, pool.get_shuffled(5))
+
+    def test_shuffled_uniform(self):
+        pool = LetterPool.build('abcd')
+        draws = 2400
+        counts = Counter(next(pool.iterate_shuffled(1, rng=random.Random(seed))) for seed in range(draws))
+        self.assertEqual(24, len(counts))
+        expected = draws / 24
+        chi_square = sum((observed - expected) ** 2 / expected for observed in counts.values())
+        # the 99.9th percentile of chi-square with 23 degrees of freedom is 49.7
+        self.assertLess(chi_square, 49.7)
+
+    def test_shuffled_large(self):
+        pool = LetterPool.build('abcdefghijklm')
+        self.assertGreater(pool.count_shuffled(), anagrammary._SAMPLE_MAX)
+        shuffles = list(pool.iterate_shuffled(500, rng=random.Random(0)))
+        self.assertEqual(500, len(set(shuffles)))
+        self.assertTrue(all(sorted(s) == list('ABCDEFGHIJKLM') for s in shuffles))
+
+    def test_unrank(self):
+        counts = {'B': 1, 'A': 3, 'N': 2, 'S': 1}
+        arrangements = sorted(set(itertools.permutations('BANANAS')))
+        self.assertEqual(len(arrangements), anagrammary.count_arrangements(counts))
+        for rank in range(len(arrangements)):
+            self.assertTupleEqual(arrangements[rank], anagrammary.unrank_arrangement(counts, rank))
+
+    def test_random_permutation(self):
+        for size in (1, 2, 5, 64, 1000):
+            with self.subTest(size=size):
+                self.assertListEqual(list(range(size)), sorted(anagrammary._RandomPermutation(size, random.Random(size))))
+
+
+class TestSpellableWords(unittest.TestCase):
+
+    def test_spellable(self):
+        pool = LetterPool.build('tease_')
+        tracker = SpellableWords(_WORDS, pool)
+        self.assertNotIn('CASES', tracker.words)
+        self.assertListEqual(_spellable(_WORDS, pool), tracker.spellable(pool.num_blanks))
+        pool.consume('TE')
+        tracker.update(pool)
+        self.assertListEqual(['A', 'CASE', 'EAT', 'SEAT', 'SET', 'TEA'], tracker.spellable(pool.num_blanks))
+
+    def test_same_as_recomputed(self):
+        rng = random.Random(0)
+        pool = LetterPool.build('teasec__')
+        tracker = SpellableWords(_WORDS, pool)
+        for _ in range(200):
+            if rng.random() < 0.6:
+                pool.consume(rng.choice('TEASCX'))
+            elif rng.random() < 0.9:
+                pool.undo(rng.randint(1, 3))
+            else:
+                pool.reset()
+            tracker.update(pool)
+            self.assertListEqual(_spellable(_WORDS, pool), tracker.spellable(pool.num_blanks))
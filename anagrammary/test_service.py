@@ -0,0 +1,74 @@
+import io
+import os
+import json
+import errno
+import socket
+import tempfile
+import unittest
+from anagrammary import service
+from wordpal.puzzicon import Puzzeme
+import common.testing
+
+common.testing.configure_logging()
+
+_PUZZEMES = frozenset([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('reason'), Puzzeme('are'), Puzzeme('son')])
+
+
+class TestAnagramService(unittest.TestCase):
+
+    def test_answer(self):
+        s = service.AnagramService(_PUZZEMES)
+        self.assertListEqual(['ARE', 'BAR'], s.answer({'letters': 'AR?'})['answers'])
+        self.assertListEqual(['ARE SON', 'REASON', 'SON ARE'], s.answer({'letters': 'RNEOAS', 'max_words': 2})['answers'])
+        self.assertListEqual(['ARE SON', 'REASON'], s.answer({'letters': 'RNEOAS', 'max_words': 2, 'ordered': False})['answers'])
+        self.assertEqual(3, len(s.oracles))
+
+    def test_oracle_reused(self):
+        s = service.AnagramService(_PUZZEMES)
+        s.answer({'letters': 'OOF'})
+        oracle = s.oracle(1, None, True, 'index')
+        s.answer({'letters': 'RAB'})
+        self.assertIs(oracle, s.oracle(1, None, True, 'index'))
+
+    def test_oracles_bounded(self):
+        s = service.AnagramService(_PUZZEMES, max_oracles=2)
+        for threshold in (-10, -20, -30, -40):
+            s.answer({'letters': 'OOF', 'threshold': threshold})
+        self.assertListEqual([(1, -30, True, 'index'), (1, -40, True, 'index')], list(s.oracles))
+        self.assertIn('error', json.loads(s.handle_line('{"letters": "OOF", "threshold": "x"}')))
+
+    def test_serve_unix_refuses_file(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            pathname = os.path.join(tempdir, 'notes.txt')
+            with open(pathname, 'w') as ofile:
+                ofile.write("keep me\n")
+            with self.assertRaises(FileExistsError):
+                service.serve_unix(service.AnagramService(_PUZZEMES), pathname)
+            self.assertTrue(os.path.exists(pathname))
+
+    def test_serve_unix_sockets(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            pathname = os.path.join(tempdir, 'anagrams.sock')
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as live:
+                live.bind(pathname)
+                live.listen(1)
+                with self.assertRaises(OSError) as cm:
+                    service.serve_unix(service.AnagramService(_PUZZEMES), pathname)
+                self.assertEqual(errno.EADDRINUSE, cm.exception.errno)
+                self.assertTrue(os.path.exists(pathname))
+            # the listener is closed but its socket file remains
+            service._remove_stale_socket(pathname)
+            self.assertFalse(os.path.lexists(pathname))
+
+    def test_serve_stream(self):
+        s = service.AnagramService(_PUZZEMES)
+        ifile = io.StringIO('{"id": 7, "letters": "OFO"}\n\nnot json\n{"id": 8, "letters": "X", "max_words": 0}\n')
+        ofile = io.StringIO()
+        s.serve_stream(ifile, ofile)
+        responses = [json.loads(line) for line in ofile.getvalue().splitlines()]
+        self.assertEqual(3, len(responses))
+        self.assertEqual(7, responses[0]['id'])
+        self.assertListEqual(['FOO'], responses[0]['answers'])
+        self.assertIn('error', responses[1])
+        self.assertEqual(8, responses[2]['id'])
+        self.assertIn('error', responses[2])
@@ -0,0 +1,37 @@
+"""Benchmarks for the hot paths of the word tools.
+
+Each benchmark module can be run with `python -m benchmarks.<module>`.
+"""
+
+import time
+import random
+from typing import List
+
+# approximate relative frequencies of letters in English text
+_LETTER_WEIGHTS = {
+    'A': 82, 'B': 15, 'C': 28, 'D': 43, 'E': 127, 'F': 22, 'G': 20, 'H': 61,
+    'I': 70, 'J': 2, 'K': 8, 'L': 40, 'M': 24, 'N': 67, 'O': 75, 'P': 19,
+    'Q': 1, 'R': 60, 'S': 63, 'T': 91, 'U': 28, 'V': 10, 'W': 24, 'X': 2,
+    'Y': 20, 'Z': 1,
+}
+
+
+def synthetic_words(n: int, seed: int=0, min_length: int=2, max_length: int=12) -> List[str]:
+    """Return n distinct pseudo-words, the same ones for the same arguments."""
+    rng = random.Random(seed)
+    letters, weights = zip(*sorted(_LETTER_WEIGHTS.items()))
+    words, seen = [], set()
+    while len(words) < n:
+        length = min(max_length, max(min_length, int(rng.gauss(7, 2.5))))
+        word = ''.join(rng.choices(letters, weights, k=length))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def timed(fn, *args, **kwargs):
+    """Call a function and return its result and elapsed time in seconds."""
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - start
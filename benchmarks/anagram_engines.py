@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+
+"""Compare the compute_soul dictionary with the NumPy letter-count matrix.
+
+    python -m benchmarks.anagram_engines --size 100000 --queries 1000
+"""
+
+import random
+import logging
+from argparse import ArgumentParser
+from anagrammary.lookup import Soothsayer
+from wordpal import countmatrix
+from . import synthetic_words, timed
+
+_log = logging.getLogger(__name__)
+
+
+def _scrambled(words, n, seed):
+    rng = random.Random(seed)
+    queries = []
+    for word in rng.sample(words, min(n, len(words))):
+        letters = list(word)
+        rng.shuffle(letters)
+        queries.append(''.join(letters))
+    return queries
+
+
+def main():
+    parser = ArgumentParser(description="benchmark anagram lookup engines")
+    parser.add_argument("--size", type=int, default=100000, help="number of dictionary words")
+    parser.add_argument("--queries", type=int, default=1000, help="number of queries")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    words = synthetic_words(args.size, args.seed)
+    queries = _scrambled(words, args.queries, args.seed)
+    soothsayer, build_time = timed(Soothsayer.build, words)
+    expected, lookup_time = timed(lambda: [soothsayer.lookup(q) for q in queries])
+    print("soothsayer: build {:.3f}s, {} lookups {:.3f}s".format(build_time, len(queries), lookup_time))
+    if not countmatrix.available():
+        print("matrix: skipped (numpy is not installed)")
+        return 0
+    matrix, build_time = timed(countmatrix.LetterCountMatrix, words)
+    actual, lookup_time = timed(matrix.anagrams, queries)
+    print("matrix: build {:.3f}s, {} lookups {:.3f}s".format(build_time, len(queries), lookup_time))
+    for e, a in zip(expected, actual):
+        assert set(w for (w,) in e) == set(a), "engines disagree"
+    _, spellable_time = timed(matrix.spellable, queries)
+    print("matrix: {} spellable queries {:.3f}s".format(len(queries), spellable_time))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+
+"""Compare Soothsayer signature backends by key size, build time and lookup time.
+
+    python -m benchmarks.signatures --size 100000 --size2 2000
+"""
+
+import sys
+import random
+import logging
+from argparse import ArgumentParser
+from anagrammary.lookup import Soothsayer, SIGNATURES
+from . import synthetic_words, timed
+
+_log = logging.getLogger(__name__)
+
+
+def measure(words, queries, nwords, signature):
+    soothsayer, build_time = timed(Soothsayer.build, words, nwords=nwords, signature=signature)
+    _, lookup_time = timed(lambda: [soothsayer.lookup(q) for q in queries])
+    keys = soothsayer.wordmap.keys()
+    return {
+        'signature': signature,
+        'nwords': nwords,
+        'words': len(words),
+        'keys': len(keys),
+        'mean_key_bytes': sum(map(sys.getsizeof, keys)) / max(len(keys), 1),
+        'build_s': build_time,
+        'lookup_us': lookup_time / max(len(queries), 1) * 1e6,
+    }
+
+
+def main():
+    parser = ArgumentParser(description="benchmark anagram signature backends")
+    parser.add_argument("--size", type=int, default=100000, help="number of dictionary words for 1-word maps")
+    parser.add_argument("--size2", type=int, default=2000, help="number of dictionary words for 2-word maps")
+    parser.add_argument("--queries", type=int, default=10000, help="number of lookups")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    rng = random.Random(args.seed)
+    print("{:<8} {:>6} {:>8} {:>9} {:>10} {:>9} {:>10}".format('sig', 'nwords', 'words', 'keys', 'key bytes', 'build s', 'lookup us'))
+    for nwords, size in ((1, args.size), (2, args.size2)):
+        words = synthetic_words(size, args.seed)
+        queries = [''.join(rng.sample(words, nwords)) for _ in range(args.queries)]
+        for signature in SIGNATURES:
+            m = measure(words, queries, nwords, signature)
+            print("{signature:<8} {nwords:>6} {words:>8} {keys:>9} {mean_key_bytes:>10.1f} {build_s:>9.3f} {lookup_us:>10.2f}".format(**m))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+
+"""Benchmark suite over synthetic dictionaries, with JSON baselines.
+
+    python -m benchmarks.suite run --sizes 1000 10000 100000 -o baseline.json
+    python -m benchmarks.suite run -o current.json
+    python -m benchmarks.suite compare baseline.json current.json --threshold 0.2
+
+Each case is timed several times and the fastest time is recorded. The
+compare command exits with status 1 if any case is slower than its
+baseline by more than the threshold fraction.
+"""
+
+import sys
+import json
+import time
+import random
+import logging
+import platform
+from argparse import ArgumentParser
+from typing import Callable, Dict, List, Tuple
+from anagrammary.lookup import Soothsayer, Template
+from wordpal.puzzicon import Puzzeme, Puzzarian, Filters
+from pb5.balloons import WordSearcher, MODE_MULTISET, MODE_PERMUTE
+from pb5.cravats import WordProducer
+from . import synthetic_words
+
+_log = logging.getLogger(__name__)
+
+# multi-word maps grow as size^nwords, so they are built from a prefix of the wordlist
+_MULTIWORD_CAPS = {1: None, 2: 2000, 3: 120}
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 3
+
+
+def best_time(fn: Callable, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def cases(size: int, seed: int=0) -> List[Tuple[str, Callable]]:
+    """Return (name, callable) pairs timing each hot path on a dictionary of the given size."""
+    rng = random.Random(seed)
+    words = synthetic_words(size, seed)
+    puzzemes = frozenset(map(Puzzeme, words))
+    # search caches are off so that repeats measure searches, not cache hits
+    puzzarian = Puzzarian(puzzemes, cache_size=0)
+    soothsayer = Soothsayer.build(words)
+    queries = [''.join(rng.sample(w, len(w))) for w in rng.sample(words, min(1000, size))]
+    searcher = WordSearcher(puzzemes, cache_size=0)
+    balloons = rng.choices('ABCDEFGHIJKLMNOPRSTUEAIO', k=8)
+    result = []
+    for nwords, cap in _MULTIWORD_CAPS.items():
+        subset = words[:cap] if cap else words
+        result.append(('soothsayer_build_n{}/{}'.format(nwords, len(subset)), lambda subset=subset, nwords=nwords: Soothsayer.build(subset, nwords=nwords)))
+    result += [
+        ('soothsayer_lookup_x{}'.format(len(queries)), lambda: [soothsayer.lookup(q) for q in queries]),
+        ('template_iterate_possibles_3blanks', lambda: _consume(Template.create('ET???').iterate_possibles())),
+        ('puzzarian_search_wildcard_fixed', lambda: list(puzzarian.search([Filters.canonical_wildcard('?A??S')]))),
+        ('puzzarian_search_wildcard_star', lambda: list(puzzarian.search([Filters.canonical_wildcard('S*T')]))),
+        ('puzzarian_search_regex', lambda: list(puzzarian.search([Filters.canonical_regex(r'[AEIOU]{2}.*S')]))),
+        ('wordsearcher_find_multiset', lambda: _consume(searcher.find(balloons, 5, MODE_MULTISET))),
+        ('wordsearcher_find_permute', lambda: _consume(searcher.find(balloons[:5], 4, MODE_PERMUTE))),
+        ('wordproducer_produce_permute', lambda: _consume(WordProducer(permute=True).produce(['ABC', 'DE', 'FGH', 'IA', 'BE']))),
+        ('wordproducer_produce_canonical', lambda: _consume(WordProducer(permute=True, canonical_order=True).produce(['ABC', 'DE', 'FGH', 'IA', 'BE']))),
+    ]
+    return result
+
+
+def run(sizes, repeat: int=DEFAULT_REPEAT, seed: int=0) -> Dict:
+    results = {}
+    for size in sizes:
+        _log.info("preparing cases for %d words", size)
+        for name, fn in cases(size, seed):
+            key = '{}@{}'.format(name, size)
+            results[key] = best_time(fn, repeat)
+            _log.info("%s: %.6f s", key, results[key])
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'sizes': list(sizes),
+            'repeat': repeat,
+            'seed': seed,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Tuple[str, float, float, float]]:
+    """Return (name, baseline, current, ratio) for each case slower than the threshold allows."""
+    regressions = []
+    for name, before in sorted(baseline['results'].items()):
+        after = current['results'].get(name)
+        if after is None or before <= 0:
+            continue
+        ratio = after / before
+        if ratio > 1 + threshold:
+            regressions.append((name, before, after, ratio))
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description="benchmark the hot paths on synthetic dictionaries")
+    parser.add_argument("-l", "--log-level", choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='INFO', help="set log level")
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help="run the suite and write results as JSON")
+    run_parser.add_argument("--sizes", type=int, nargs='+', default=DEFAULT_SIZES, metavar="N", help="dictionary sizes (1000 to 1000000)")
+    run_parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, metavar="N", help="time each case N times and keep the best")
+    run_parser.add_argument("--seed", type=int, default=0)
+    run_parser.add_argument("-o", "--output", metavar="FILE", help="write results to FILE instead of standard output")
+    compare_parser = subparsers.add_parser('compare', help="compare results against a baseline")
+    compare_parser.add_argument("baseline", metavar="BASELINE")
+    compare_parser.add_argument("current", metavar="CURRENT")
+    compare_parser.add_argument("--threshold", type=float, default=0.2, metavar="FRACTION", help="allowed slowdown before a case is flagged")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.__dict__[args.log_level])
+    if args.command == 'run':
+        results = run(args.sizes, args.repeat, args.seed)
+        if args.output:
+            with open(args.output, 'w') as ofile:
+                json.dump(results, ofile, indent=2, sort_keys=True)
+        else:
+            json.dump(results, sys.stdout, indent=2, sort_keys=True)
+            print()
+        return 0
+    if args.command == 'compare':
+        with open(args.baseline, 'r') as ifile:
+            baseline = json.load(ifile)
+        with open(args.current, 'r') as ifile:
+            current = json.load(ifile)
+        regressions = compare(baseline, current, args.threshold)
+        for name, before, after, ratio in regressions:
+            print("REGRESSION {}: {:.6f}s -> {:.6f}s ({:.2f}x)".format(name, before, after, ratio))
+        missing = sorted(set(baseline['results']) - set(current['results']))
+        for name in missing:
+            print("MISSING {}".format(name))
+        if not regressions:
+            print("no regressions beyond {:.0%}".format(args.threshold))
+        return 1 if regressions else 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    exit(main())
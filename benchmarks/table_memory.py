@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+
+"""Compare the memory footprint of a frozenset of Puzzemes with a PuzzemeTable.
+
+    python -m benchmarks.table_memory --size 500000
+"""
+
+import logging
+import tracemalloc
+from argparse import ArgumentParser
+from common import memory
+from wordpal.puzzicon import Puzzeme, PuzzemeTable, Puzzarian
+from . import synthetic_words, timed
+
+_log = logging.getLogger(__name__)
+
+
+def allocated(fn, *args):
+    """Call a function and return its result and the bytes it left allocated."""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = fn(*args)
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = ArgumentParser(description="measure puzzeme storage footprints")
+    parser.add_argument("--size", type=int, default=500000, help="number of dictionary words")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    words = synthetic_words(args.size, args.seed)
+    renderings = [w.lower() for w in words]
+    puzzemes, set_bytes = allocated(lambda: frozenset(Puzzeme.restore(w, r) for w, r in zip(words, renderings)))
+    table, table_bytes = allocated(PuzzemeTable.from_columns, words, renderings)
+    print("{:<12} {:>14} {:>10} {:>10}".format('storage', 'bytes', 'per word', 'index s'))
+    for name, storage, nbytes in (('frozenset', puzzemes, set_bytes), ('table', table, table_bytes)):
+        _, index_time = timed(Puzzarian, storage)
+        print("{:<12} {:>14,} {:>10.1f} {:>10.3f}".format(name, nbytes, nbytes / len(words), index_time))
+    _log.info("deep sizes: frozenset %s, table %s", memory.format_size(memory.deep_size(puzzemes)), memory.format_size(memory.deep_size(table)))
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
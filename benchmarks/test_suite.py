@@ -0,0 +1,32 @@
+import unittest
+from benchmarks import synthetic_words, suite
+import common.testing
+
+common.testing.configure_logging()
+
+
+class TestSyntheticWords(unittest.TestCase):
+
+    def test_deterministic(self):
+        words = synthetic_words(500, seed=3)
+        self.assertEqual(500, len(set(words)))
+        self.assertListEqual(words, synthetic_words(500, seed=3))
+        self.assertNotEqual(words, synthetic_words(500, seed=4))
+        self.assertTrue(all(w.isalpha() and w.isupper() for w in words))
+
+
+class TestSuite(unittest.TestCase):
+
+    def test_compare(self):
+        baseline = {'results': {'a': 1.0, 'b': 1.0, 'c': 1.0}}
+        current = {'results': {'a': 1.1, 'b': 1.5}}
+        regressions = suite.compare(baseline, current, 0.2)
+        self.assertListEqual(['b'], [r[0] for r in regressions])
+        self.assertAlmostEqual(1.5, regressions[0][3])
+
+    def test_cases_run(self):
+        for name, fn in suite.cases(200):
+            if name.startswith('soothsayer_build_n3'):
+                continue
+            with self.subTest(name=name):
+                fn()
@@ -0,0 +1,94 @@
+"""Named timers and counters for the hot paths.
+
+Instrumentation is disabled by default. While disabled, timer() returns a
+shared no-op context manager and count() returns immediately, so leaving
+the calls in place costs next to nothing.
+"""
+
+import time
+from collections import defaultdict
+from typing import Dict
+from . import reports
+
+_recorder = None
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = defaultdict(int)
+
+    def report(self) -> Dict:
+        return {
+            'wall_seconds': time.perf_counter() - self.started,
+            'timers': dict((name, {'seconds': self.seconds[name], 'calls': self.calls[name]}) for name in sorted(self.seconds)),
+            'counters': dict(sorted(self.counters.items())),
+        }
+
+
+class _Timer(object):
+
+    def __init__(self, recorder: Recorder, name: str):
+        self.recorder = recorder
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.recorder.seconds[self.name] += time.perf_counter() - self.start
+        self.recorder.calls[self.name] += 1
+        return False
+
+
+class _NullTimer(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def enable() -> Recorder:
+    """Start recording, discarding anything recorded before."""
+    global _recorder
+    _recorder = Recorder()
+    return _recorder
+
+
+def disable():
+    global _recorder
+    _recorder = None
+
+
+def enabled() -> bool:
+    return _recorder is not None
+
+
+def timer(name: str):
+    """Return a context manager that adds its elapsed time to the named timer."""
+    if _recorder is None:
+        return _NULL_TIMER
+    return _Timer(_recorder, name)
+
+
+def count(name: str, n: int=1):
+    if _recorder is not None:
+        _recorder.counters[name] += n
+
+
+def report() -> Dict:
+    return _recorder.report() if _recorder is not None else {}
+
+
+def write_report(pathname: str=None):
+    """Write the report as JSON to a file, or to standard error if pathname is None or '-'."""
+    reports.write_json(report(), pathname)
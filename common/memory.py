@@ -0,0 +1,216 @@
+"""Memory accounting for dictionary and index structures.
+
+Structures report their deep size through account(), builds record their
+peak allocation through peak(), and builds that grow combinatorially call
+check_budget() with a projection of their size before they start. Like
+common.instrument, accounting is disabled by default and account() and
+peak() cost next to nothing until enable() is called; check_budget() is
+always active.
+"""
+
+import os
+import sys
+import logging
+import tracemalloc
+from typing import Dict, Optional
+from . import reports
+
+_log = logging.getLogger(__name__)
+
+_ENV_BUDGET = 'FUN_WITH_WORDS_MEMORY_BUDGET'
+DEFAULT_BUDGET = 2 * 1024 ** 3
+_budget = None
+_ledger = None
+
+
+def deep_size(obj, seen: set=None) -> int:
+    """Estimate the size in bytes of an object and everything it references.
+
+    Containers, instance dictionaries and slots are followed; an object
+    referenced more than once is counted once.
+    """
+    seen = set() if seen is None else seen
+    stack = [obj]
+    total = 0
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if isinstance(item, (str, bytes, int, float, bool, type(None))):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        if hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+        for cls in type(item).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if hasattr(item, name):
+                    stack.append(getattr(item, name))
+    return total
+
+
+def footprint(obj, entries: int=None, seen: set=None) -> Dict:
+    """Return the deep size of a structure, and its size per entry if the number of entries is given."""
+    if entries is None:
+        try:
+            entries = len(obj)
+        except TypeError:
+            pass
+    size = deep_size(obj, seen)
+    return {
+        'bytes': size,
+        'entries': entries,
+        'bytes_per_entry': size / entries if entries else None,
+    }
+
+
+class Ledger(object):
+
+    def __init__(self):
+        self.structures = {}
+        self.peaks = {}
+        self._stack = []
+        self._started_tracing = not tracemalloc.is_tracing()
+        if self._started_tracing:
+            tracemalloc.start()
+
+    def report(self) -> Dict:
+        current, peak = tracemalloc.get_traced_memory() if tracemalloc.is_tracing() else (None, None)
+        return {
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'budget_bytes': budget(),
+            'peaks': dict(sorted(self.peaks.items())),
+            'structures': dict(sorted(self.structures.items())),
+        }
+
+    def close(self):
+        if self._started_tracing and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+
+class _Peak(object):
+    """Record the peak memory allocated, beyond what was allocated on entry, while the block runs."""
+
+    def __init__(self, ledger: Ledger, name: str):
+        self.ledger = ledger
+        self.name = name
+
+    def __enter__(self):
+        current, peak = tracemalloc.get_traced_memory()
+        # resetting the peak hides it from enclosing blocks, so pass it on first
+        for outer in self.ledger._stack:
+            outer.highest = max(outer.highest, peak)
+        tracemalloc.reset_peak()
+        self.baseline = current
+        self.highest = current
+        self.ledger._stack.append(self)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.ledger._stack.pop()
+        self.highest = max(self.highest, tracemalloc.get_traced_memory()[1])
+        for outer in self.ledger._stack:
+            outer.highest = max(outer.highest, self.highest)
+        self.ledger.peaks[self.name] = max(self.ledger.peaks.get(self.name, 0), self.highest - self.baseline)
+        return False
+
+
+class _NullPeak(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_PEAK = _NullPeak()
+
+
+def enable() -> Ledger:
+    """Start accounting and tracing allocations, discarding anything recorded before."""
+    global _ledger
+    disable()
+    _ledger = Ledger()
+    return _ledger
+
+
+def disable():
+    global _ledger
+    if _ledger is not None:
+        _ledger.close()
+    _ledger = None
+
+
+def enabled() -> bool:
+    return _ledger is not None
+
+
+def account(name: str, obj, entries: int=None):
+    """Record the footprint of a structure under the given name, if accounting is enabled."""
+    if _ledger is not None:
+        _ledger.structures[name] = footprint(obj, entries)
+
+
+def peak(name: str):
+    """Return a context manager that records the peak allocation of the block under the given name."""
+    if _ledger is None:
+        return _NULL_PEAK
+    return _Peak(_ledger, name)
+
+
+def budget() -> Optional[int]:
+    """Return the memory budget in bytes, or None if there is no budget."""
+    if _budget is not None:
+        return _budget or None
+    configured = os.getenv(_ENV_BUDGET)
+    if configured:
+        return parse_size(configured) or None
+    return DEFAULT_BUDGET
+
+
+def set_budget(nbytes: Optional[int]):
+    """Set the memory budget in bytes; 0 means no budget and None restores the default."""
+    global _budget
+    _budget = nbytes
+
+
+def parse_size(text: str) -> int:
+    """Parse a size like 512M, 2G or 1048576 into a number of bytes."""
+    text = text.strip().upper().rstrip('B')
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def format_size(nbytes: int) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if abs(nbytes) < 1024:
+            return '{:.1f} {}'.format(nbytes, unit)
+        nbytes /= 1024
+    return '{:.1f} TiB'.format(nbytes)
+
+
+def check_budget(description: str, projected: int) -> bool:
+    """Warn if a projected size exceeds the budget, and return whether it fits."""
+    limit = budget()
+    if limit is not None and projected > limit:
+        _log.warning("%s is projected to need %s, over the memory budget of %s", description, format_size(projected), format_size(limit))
+        return False
+    return True
+
+
+def report() -> Dict:
+    return _ledger.report() if _ledger is not None else {}
+
+
+def write_report(pathname: str=None):
+    """Write the report as JSON to a file, or to standard error if pathname is None or '-'."""
+    reports.write_json(report(), pathname)
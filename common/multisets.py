@@ -0,0 +1,26 @@
+"""Helpers for letter multisets shared by the puzzle solvers."""
+
+import math
+from typing import Mapping, Sequence
+
+
+def can_draw(letters: Sequence[str], lettersets: Sequence) -> bool:
+    """Check whether each letter can be drawn from a distinct letterset."""
+    owners = [None] * len(lettersets)
+    def _augment(i, visited):
+        for j, letterset in enumerate(lettersets):
+            if j not in visited and letters[i] in letterset:
+                visited.add(j)
+                if owners[j] is None or _augment(owners[j], visited):
+                    owners[j] = i
+                    return True
+        return False
+    return all(_augment(i, set()) for i in range(len(letters)))
+
+
+def count_arrangements(counts: Mapping) -> int:
+    """Return the number of distinct arrangements of a multiset, given as a mapping of items to counts."""
+    total = math.factorial(sum(counts.values()))
+    for count in counts.values():
+        total //= math.factorial(count)
+    return total
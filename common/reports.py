@@ -0,0 +1,15 @@
+"""Output of the JSON reports written by the instrumentation modules."""
+
+import sys
+import json
+from typing import Dict
+
+
+def write_json(data: Dict, pathname: str=None):
+    """Write data as JSON to a file, or to standard error if pathname is None or '-'."""
+    text = json.dumps(data, indent=2)
+    if pathname is None or pathname == '-':
+        print(text, file=sys.stderr)
+    else:
+        with open(pathname, 'w') as ofile:
+            print(text, file=ofile)
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import unittest
+from common import instrument
+from anagrammary import lookup
+import common.testing
+
+common.testing.configure_logging()
+
+
+class TestInstrument(unittest.TestCase):
+
+    def tearDown(self):
+        instrument.disable()
+
+    def test_disabled(self):
+        instrument.disable()
+        with instrument.timer('x'):
+            instrument.count('y')
+        self.assertFalse(instrument.enabled())
+        self.assertDictEqual({}, instrument.report())
+
+    def test_timer_and_count(self):
+        instrument.enable()
+        for _ in range(3):
+            with instrument.timer('x'):
+                instrument.count('y', 2)
+        report = instrument.report()
+        self.assertEqual(3, report['timers']['x']['calls'])
+        self.assertGreaterEqual(report['timers']['x']['seconds'], 0.0)
+        self.assertDictEqual({'y': 6}, report['counters'])
+
+    def test_find_answers_counters(self):
+        instrument.enable()
+        oracle = lookup.Concordance.build(['AB', 'BA', 'CAB'])
+        answers = list(lookup.find_answers(lookup.Template.create('ab'), oracle))
+        self.assertSetEqual({'AB', 'BA'}, set(answers))
+        counters = instrument.report()['counters']
+        self.assertEqual(2, counters['hits'])
+        self.assertEqual(0, counters['duplicates'])
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+
+import unittest
+from common import memory
+from anagrammary.lookup import Soothsayer
+from pb5.cravats import WordProducer
+import common.testing
+
+common.testing.configure_logging()
+
+
+class TestMemory(unittest.TestCase):
+
+    def tearDown(self):
+        memory.disable()
+        memory.set_budget(None)
+
+    def test_deep_size(self):
+        words = ['ABC' * 10, 'DEF' * 10]
+        shallow = memory.deep_size([])
+        self.assertGreater(memory.deep_size(words), shallow + sum(len(w) for w in words))
+        self.assertEqual(memory.deep_size([words[0]]), memory.deep_size([words[0], words[0]]) - 8)
+
+    def test_account_and_peak(self):
+        memory.account('ignored', [1, 2, 3])
+        self.assertDictEqual({}, memory.report())
+        memory.enable()
+        with memory.peak('outer'):
+            with memory.peak('inner'):
+                block = bytearray(1 << 20)
+            del block
+        memory.account('list', [1, 2, 3])
+        report = memory.report()
+        self.assertGreaterEqual(report['peaks']['inner'], 1 << 20)
+        self.assertGreaterEqual(report['peaks']['outer'], 1 << 20)
+        self.assertEqual(3, report['structures']['list']['entries'])
+
+    def test_parse_size(self):
+        self.assertEqual(512 * 1024 ** 2, memory.parse_size('512M'))
+        self.assertEqual(2 * 1024 ** 3, memory.parse_size('2gb'))
+        self.assertEqual(1000, memory.parse_size('1000'))
+
+    def test_check_budget(self):
+        memory.set_budget(1000)
+        with self.assertLogs('common.memory', 'WARNING'):
+            self.assertFalse(memory.check_budget("test", 1001))
+        self.assertTrue(memory.check_budget("test", 1000))
+        memory.set_budget(0)
+        self.assertTrue(memory.check_budget("test", 10 ** 15))
+
+    def test_projected_wordmap_size(self):
+        words = ['AB', 'CD', 'EF', 'GH', 'IJ']
+        projected = Soothsayer.projected_size(len(words), 2)
+        self.assertGreater(Soothsayer.projected_size(len(words), 3), projected * len(words))
+        memory.enable()
+        Soothsayer.build(words, nwords=2)
+        measured = memory.report()['structures']['soothsayer.wordmap']
+        self.assertEqual(30, measured['entries'])
+
+    def test_producer_used(self):
+        producer = WordProducer(permute=True)
+        candidates = list(producer.produce(['AB', 'CD']))
+        self.assertSetEqual(set(candidates), producer.used)
+        self.assertGreater(producer.projected_used_size(['AB', 'CD']), 0)
+        self.assertEqual(0, WordProducer(permute=True, canonical_order=True).projected_used_size(['AB', 'CD']))
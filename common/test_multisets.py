@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+
+import unittest
+from common import multisets
+import common.testing
+
+common.testing.configure_logging()
+
+
+class TestMultisets(unittest.TestCase):
+
+    def test_can_draw(self):
+        lettersets = ['AB', 'A', 'BC']
+        self.assertTrue(multisets.can_draw('AAB', lettersets))
+        self.assertTrue(multisets.can_draw('CBA', lettersets))
+        self.assertFalse(multisets.can_draw('AAA', lettersets))
+        self.assertFalse(multisets.can_draw('ABCA', lettersets))
+        self.assertTrue(multisets.can_draw('', lettersets))
+        self.assertTrue(multisets.can_draw(['A', 'C'], [{'A', 'C'}, {'C'}]))
+
+    def test_count_arrangements(self):
+        self.assertEqual(1, multisets.count_arrangements({}))
+        self.assertEqual(6, multisets.count_arrangements({'A': 1, 'B': 1, 'C': 1}))
+        self.assertEqual(12, multisets.count_arrangements({'A': 2, 'B': 1, 'C': 1}))
+        self.assertEqual(1, multisets.count_arrangements({'A': 3, 'B': 0}))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,9 @@ import re
 import sys
 import logging
 from anagrammary.lookup import Soothsayer, Evaluator
-from anagrammary import lookup
-from wordpal import puzzicon
+from anagrammary import lookup, service
+from wordpal import puzzicon, countmatrix
+from common import instrument, memory
 from argparse import ArgumentParser
 import itertools
 
@@ -20,11 +21,42 @@ def main():
     parser.add_argument("--strict", dest="puzzeme_threshold", action='store_const', const=-10, help="restrict word list to simple words")
     parser.add_argument("-l", "--log-level", metavar="LEVEL", choices=('DEBUG', 'INFO', 'WARN', 'ERROR', 'debug', 'info', 'warn', 'error'), default='INFO', help="set log level")
     parser.add_argument("-m", "--max-words", type=int, default=1, metavar="N", help="max words per anagram")
+    parser.add_argument("--unordered", dest="ordered", action='store_false', help="print each multi-word combination once instead of every ordering")
+    parser.add_argument("--engine", choices=lookup.ENGINES, default=lookup.ENGINE_INDEX, help="single-word lookup engine; 'matrix' requires numpy")
     parser.add_argument("--dictionary", metavar="FILE", help="specify wordlist text file")
+    parser.add_argument("--limit", type=int, metavar="N", help="stop after N answers")
+    parser.add_argument("--top", type=int, metavar="K", help="print only the K best-scoring answers, best first")
+    parser.add_argument("--serve", action='store_true', help="answer newline-delimited JSON queries until input ends")
+    parser.add_argument("--socket", metavar="PATH", help="with --serve, listen on a Unix socket instead of standard input")
+    parser.add_argument("--port", type=int, metavar="PORT", help="with --serve, listen on a local TCP port instead of standard input")
+    parser.add_argument("--host", default='127.0.0.1', help="with --port, address to listen on")
+    parser.add_argument("--profile", nargs='?', const='-', metavar="FILE", help="write timers and counters as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-report", nargs='?', const='-', metavar="FILE", help="write structure sizes and peak allocations as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-budget", type=memory.parse_size, metavar="SIZE", help="warn before builds projected to need more than SIZE, e.g. 512M; 0 for no budget")
     args = parser.parse_args()
+    if args.engine == lookup.ENGINE_MATRIX and not countmatrix.available():
+        parser.error("--engine matrix requires numpy, which is not installed")
     logging.basicConfig(level=logging.__dict__[args.log_level.upper()])
-    provided = ' '.join(args.letters)
-    found = lookup.do_lookups(provided, args.dictionary, print, args.puzzeme_threshold, args.max_words)
+    if args.profile:
+        instrument.enable()
+    if args.memory_budget is not None:
+        memory.set_budget(args.memory_budget)
+    if args.memory_report:
+        memory.enable()
+    try:
+        if args.serve:
+            anagram_service = service.AnagramService(lookup.load_puzzemes(args.dictionary), args.max_words, args.puzzeme_threshold, args.ordered, args.engine, lookup.wordlist_source(args.dictionary))
+            anagram_service.oracle(args.max_words, args.puzzeme_threshold, args.ordered, args.engine)
+            service.serve(anagram_service, args.socket, args.port, args.host)
+            return 0
+        provided = ' '.join(args.letters)
+        found = lookup.do_lookups(provided, args.dictionary, print, args.puzzeme_threshold, args.max_words, args.ordered, args.engine, args.limit, args.top)
+    finally:
+        # a server runs until its input ends or it is interrupted
+        if args.profile:
+            instrument.write_report(args.profile)
+        if args.memory_report:
+            memory.write_report(args.memory_report)
     if not found:
         _log.info("zero words found")
         return 1
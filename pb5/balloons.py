@@ -5,30 +5,70 @@ import os
 import logging
 import argparse
 import itertools
+from collections import Counter
 from wordpal import puzzicon
+from common import instrument
 
 _log = logging.getLogger(__name__)
 _BLANK = '?'
+_PATTERN_BATCH = 1 << 12
+# find() repeats the same stature search for every call in multiset mode
+_SEARCH_CACHE_SIZE = 64
+MODE_PERMUTE = 'permute'
+MODE_MULTISET = 'multiset'
+MODES = (MODE_PERMUTE, MODE_MULTISET)
 
 
 class WordSearcher(object):
 
-    def __init__(self, puzzeme_set):
-        self.puzzerarian = puzzicon.Puzzarian(puzzeme_set)
+    def __init__(self, puzzeme_set, cache_size: int=_SEARCH_CACHE_SIZE):
+        self.puzzerarian = puzzicon.Puzzarian(puzzeme_set, cache_size=cache_size)
     
-    def find(self, balloons, num_balloons):
+    def find(self, balloons, num_balloons, mode=MODE_PERMUTE):
+        """Find words of the given length spelled by balloons plus one wildcard.
+
+        In permute mode, every arrangement of every combination of balloons
+        is searched for separately, and a word is yielded once for each
+        arrangement that matches it. In multiset mode, words of the given
+        length are examined in a single pass and each is yielded once.
+        """
         assert isinstance(num_balloons, int) and num_balloons > 0, "target length must be a positive integer"
+        assert mode in MODES, "mode must be one of " + str(MODES)
         balloons = [b.upper() for b in balloons]
-        combos = itertools.combinations(balloons, num_balloons - 1)
-        for combo in combos:
+        if mode == MODE_MULTISET:
+            return self._find_multiset(balloons, num_balloons)
+        return self._find_permute(balloons, num_balloons)
+
+    def _find_multiset(self, balloons, num_balloons):
+        pool = Counter(balloons)
+        seen = set()
+        for match in self.puzzerarian.search([puzzicon.Filters.stature(num_balloons)]):
+            canonical = match.canonical
+            if canonical in seen:
+                continue
+            seen.add(canonical)
+            instrument.count('balloons.candidates')
+            excess = 0
+            for letter, count in Counter(canonical).items():
+                if count > pool[letter]:
+                    excess += count - pool[letter]
+                    if excess > 1:
+                        break
+            if excess <= 1:
+                instrument.count('balloons.hits')
+                yield canonical
+
+    def _patterns(self, balloons, num_balloons):
+        for combo in itertools.combinations(balloons, num_balloons - 1):
             _log.debug("examining balloon combo %s", combo)
             combo = list(combo) + [_BLANK]
-            if len(combo) == num_balloons:
-                for perm in itertools.permutations(combo, len(combo)):
-                    pattern = ''.join(perm)
-                    _log.debug("searching dictionary for pattern %s", pattern)
-                    filters = [puzzicon.Filters.canonical_wildcard(pattern)]
-                    for match in self.puzzerarian.search(filters):
-                        yield match.canonical
-
+            for perm in itertools.permutations(combo, len(combo)):
+                yield ''.join(perm)
 
+    def _find_permute(self, balloons, num_balloons):
+        for patterns in puzzicon.chunked(self._patterns(balloons, num_balloons), _PATTERN_BATCH):
+            instrument.count('balloons.patterns', len(patterns))
+            for matches in self.puzzerarian.search_many(patterns):
+                for match in matches:
+                    instrument.count('balloons.hits')
+                    yield match.canonical
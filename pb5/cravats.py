@@ -1,6 +1,10 @@
 import itertools
 import logging
 import math
+import sys
+from collections import Counter
+from typing import Dict, Iterable
+from common import memory, multisets
 
 _log = logging.getLogger(__name__)
 
@@ -10,8 +14,11 @@ class WordProducer(object):
         self.permute = False
         self.allow_duplicates = False
         self.restrict_perms = None
+        self.canonical_order = False
         for k in kwargs:
             setattr(self, k, kwargs[k])
+        self.duplicates_avoided = 0
+        self.used = set()
 
     def calc_product_size(self, lettersets):
         n = 1
@@ -22,7 +29,28 @@ class WordProducer(object):
     def count_candidates(self, lettersets):
         factor = 1 if not self.permute else math.factorial(len(lettersets))
         return factor * self.calc_product_size(lettersets)
+
+    def count_raw_candidates(self, lettersets):
+        """Count the candidates that produce() considers, duplicates included."""
+        if self.permute and self.restrict_perms:
+            if len(self.restrict_perms) != 1:
+                # a combo of single letters never contains a longer string
+                return 0
+            without = 1
+            for s in lettersets:
+                without *= len(s) - s.count(self.restrict_perms)
+            combos = self.calc_product_size(lettersets) - without
+            return math.factorial(max(len(lettersets) - 1, 0)) * combos
+        return self.count_candidates(lettersets)
     
+    def projected_used_size(self, lettersets) -> int:
+        """Estimate the bytes the set of produced candidates needs to avoid duplicates."""
+        if self.allow_duplicates or self.canonical_order:
+            return 0
+        # string plus roughly two hash table slots of hash and reference
+        per_candidate = sys.getsizeof('A' * len(lettersets)) + 32
+        return self.count_raw_candidates(lettersets) * per_candidate
+
     @classmethod
     def _remove_one(cls, combo, element):
         if element not in combo:
@@ -33,7 +61,12 @@ class WordProducer(object):
     
     def produce(self, lettersets):
         _log.debug("expect %s candidates from %d lettersets with lengths: %s", self.count_candidates(lettersets), len(lettersets), [len(s) for s in lettersets])
-        used = set()
+        self.duplicates_avoided = 0
+        if self.canonical_order and not self.allow_duplicates:
+            yield from self._produce_canonical(lettersets)
+            return
+        used = self.used = set()
+        memory.check_budget("set of candidates produced from {} lettersets".format(len(lettersets)), self.projected_used_size(lettersets))
         cartesian = itertools.product(*lettersets)
         if self.permute:
             if self.restrict_perms:
@@ -43,6 +76,7 @@ class WordProducer(object):
                         for tail in itertools.permutations(unrestricted):
                             value = self.restrict_perms + ''.join(tail)
                             if value in used:
+                                self.duplicates_avoided += 1
                                 continue
                             if not self.allow_duplicates:
                                 used.add(value)
@@ -52,6 +86,7 @@ class WordProducer(object):
                     for seq in itertools.permutations(combo):
                         value = ''.join(seq)
                         if value in used:
+                            self.duplicates_avoided += 1
                             continue
                         if not self.allow_duplicates:
                             used.add(value)
@@ -60,7 +95,187 @@ class WordProducer(object):
             for seq in cartesian:
                 value = ''.join(seq)
                 if value in used:
+                    self.duplicates_avoided += 1
                     continue
                 if not self.allow_duplicates:
                     used.add(value)
                 yield value
+
+    def _produce_canonical(self, lettersets):
+        """Produce distinct candidates without remembering those already produced.
+
+        Without permutation, duplicate letters within a letterset are the
+        only source of duplicates, so each letterset is deduplicated. With
+        permutation, each distinct multiset of letters that can be drawn
+        from the lettersets is enumerated once, in sorted order, and its
+        distinct permutations are generated in lexicographic order.
+        """
+        if not self.permute:
+            occurrences = [Counter(s) for s in lettersets]
+            for seq in itertools.product(*map(_unique, lettersets)):
+                raw = 1
+                for letter, counts in zip(seq, occurrences):
+                    raw *= counts[letter]
+                self.duplicates_avoided += raw - 1
+                yield ''.join(seq)
+        else:
+            first = self.restrict_perms or ''
+            if len(first) > 1:
+                # as in produce(), a combo of single letters never contains a longer string
+                return
+            draws = _draw_counter(lettersets)
+            for multiset in _drawable_multisets(lettersets):
+                tail = multiset
+                if first:
+                    if first not in multiset:
+                        continue
+                    i = multiset.index(first)
+                    tail = multiset[:i] + multiset[i + 1:]
+                # duplicates are counted as avoided when the multiset is reached
+                raw = draws(multiset) * math.factorial(len(tail))
+                self.duplicates_avoided += raw - multisets.count_arrangements(Counter(tail))
+                for perm in _multiset_permutations(tail):
+                    yield first + perm
+        _log.debug("%d duplicates avoided", self.duplicates_avoided)
+
+
+def _draw_counter(lettersets):
+    """Return a function counting the ways to draw a sorted multiset of letters, one from each letterset.
+
+    Letters occurring more than once in a letterset are counted once per
+    occurrence, as itertools.product does. Counts of the multisets left to
+    draw from each suffix of the lettersets are remembered between calls.
+    """
+    occurrences = [Counter(s) for s in lettersets]
+    memo = {}
+    def _ways(j, remaining):
+        if j == len(occurrences):
+            return 1 if not remaining else 0
+        key = (j, remaining)
+        if key not in memo:
+            total = 0
+            for i, letter in enumerate(remaining):
+                if occurrences[j][letter] and (i == 0 or remaining[i - 1] != letter):
+                    total += occurrences[j][letter] * _ways(j + 1, remaining[:i] + remaining[i + 1:])
+            memo[key] = total
+        return memo[key]
+    return lambda multiset: _ways(0, ''.join(multiset))
+
+
+def _unique(letters):
+    return ''.join(sorted(set(letters), key=letters.index))
+
+
+def _drawable_multisets(lettersets):
+    """Yield, as sorted strings, the distinct multisets formed by drawing one letter from each letterset."""
+    alphabet = sorted(set(''.join(lettersets)))
+    n = len(lettersets)
+    def _extend(prefix, start):
+        if len(prefix) == n:
+            yield prefix
+            return
+        for k in range(start, len(alphabet)):
+            candidate = prefix + alphabet[k]
+            if multisets.can_draw(candidate, lettersets):
+                yield from _extend(candidate, k)
+    return _extend('', 0)
+
+
+def _multiset_permutations(letters):
+    """Yield the distinct permutations of a string in lexicographic order."""
+    seq = sorted(letters)
+    n = len(seq)
+    while True:
+        yield ''.join(seq)
+        i = n - 2
+        while i >= 0 and seq[i] >= seq[i + 1]:
+            i -= 1
+        if i < 0:
+            return
+        j = n - 1
+        while seq[j] <= seq[i]:
+            j -= 1
+        seq[i], seq[j] = seq[j], seq[i]
+        seq[i + 1:] = reversed(seq[i + 1:])
+
+
+_END = '$'
+
+
+def build_trie(words: Iterable[str]) -> Dict:
+    """Build a prefix trie of nested dictionaries keyed by letter."""
+    root = {}
+    for word in words:
+        node = root
+        for letter in word:
+            node = node.setdefault(letter, {})
+        node[_END] = True
+    return root
+
+
+class GuidedWordProducer(WordProducer):
+    """Producer that walks a prefix trie of dictionary words.
+
+    Candidates are built one letter at a time, and any partial assignment
+    whose prefix begins no dictionary word is abandoned, so only words from
+    the dictionary are produced. The permute, allow_duplicates and
+    restrict_perms settings have the same meaning as for WordProducer.
+    """
+
+    def __init__(self, canonicals: Iterable[str], **kwargs):
+        super(GuidedWordProducer, self).__init__(**kwargs)
+        self.canonicals = tuple(canonicals)
+
+    def _build_trie(self, lettersets):
+        length, alphabet = len(lettersets), set(''.join(lettersets))
+        words = [c for c in self.canonicals if len(c) == length and alphabet.issuperset(c)]
+        _log.debug("%d dictionary words could be formed from lettersets", len(words))
+        return build_trie(words)
+
+    def _walk(self, node, remaining, prefix, found):
+        if not remaining:
+            if _END in node and (self.allow_duplicates or prefix not in found):
+                if not self.allow_duplicates:
+                    found.add(prefix)
+                yield prefix
+            return
+        tried = set()
+        for j in range(len(remaining) if self.permute else 1):
+            rest = remaining[:j] + remaining[j + 1:]
+            letters = remaining[j] if self.allow_duplicates else _unique(remaining[j])
+            for letter in letters:
+                child = node.get(letter)
+                if child is None:
+                    continue
+                if not self.allow_duplicates:
+                    key = (letter, tuple(sorted(rest)))
+                    if key in tried:
+                        continue
+                    tried.add(key)
+                yield from self._walk(child, rest, prefix + letter, found)
+
+    def produce(self, lettersets):
+        # dictionary canonicals are uppercase
+        lettersets = tuple(s.upper() for s in lettersets)
+        trie = self._build_trie(lettersets)
+        found = set()
+        if self.permute and self.restrict_perms:
+            first = self.restrict_perms.upper()
+            child = trie.get(first)
+            if child is None:
+                return
+            tried = set()
+            for j, letterset in enumerate(lettersets):
+                # take the restricted letter from the earliest letterset that supplies it
+                rest = tuple(s.replace(first, '') if i < j else s for i, s in enumerate(lettersets) if i != j)
+                for letter in letterset if self.allow_duplicates else _unique(letterset):
+                    if letter != first:
+                        continue
+                    if not self.allow_duplicates:
+                        key = tuple(sorted(rest))
+                        if key in tried:
+                            continue
+                        tried.add(key)
+                    yield from self._walk(child, rest, first, found)
+        else:
+            yield from self._walk(trie, lettersets, '', found)
@@ -6,6 +6,7 @@ import sys
 import logging
 import unittest
 from wordpal.puzzicon import Puzzeme
+from pb5 import balloons
 from pb5.balloons import WordSearcher
 import common.testing
 
@@ -23,4 +24,15 @@ class TestWordSearcher(unittest.TestCase):
             matches.add(match)
         self.assertSetEqual(set(['BAR', 'BAZ']), matches)
 
+    def test_search_multiset(self):
+        searcher = WordSearcher(frozenset([Puzzeme('foo'), Puzzeme('bar'), Puzzeme('baz'), Puzzeme('Bar'), Puzzeme('gag'), Puzzeme('bag')]))
+        matches = list(searcher.find(('B', 'A', 'F', 'G'), 3, balloons.MODE_MULTISET))
+        self.assertEqual(len(matches), len(set(matches)), "each match must be yielded once")
+        self.assertSetEqual(set(['BAR', 'BAZ', 'BAG', 'GAG']), set(matches))
 
+    def test_search_multiset_same_as_permute(self):
+        searcher = WordSearcher(frozenset(map(Puzzeme, ['foo', 'bar', 'baz', 'gag', 'bag', 'fob', 'boa', 'abba', 'gaga', 'bogs', 'a', 'fa'])))
+        for pool, n in [('BAFG', 3), ('BAGO', 3), ('ABBG', 4), ('GA', 2), ('AG', 4), ('OA', 1), ('B', 3)]:
+            with self.subTest(pool=pool, n=n):
+                expected = set(searcher.find(pool, n, balloons.MODE_PERMUTE))
+                self.assertSetEqual(expected, set(searcher.find(pool, n, balloons.MODE_MULTISET)))
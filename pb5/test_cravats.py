@@ -5,8 +5,10 @@ import io
 import sys
 import logging
 import unittest
+import itertools
+from collections import Counter
 from wordpal.puzzicon import Puzzeme
-from pb5.cravats import WordProducer
+from pb5.cravats import WordProducer, GuidedWordProducer
 import common.testing
 
 _log = logging.getLogger(__name__)
@@ -89,4 +91,71 @@ class TestWordProducer(unittest.TestCase):
             self.assertIsInstance(word, str)
             self.assertEqual(len(lettersets), len(word), "each word produced must have length equal to number of lettersets; found {}".format(word))
             produced.append(word)
-        self.assertEqual(2, len(produced))
\ No newline at end of file
+        self.assertEqual(2, len(produced))
+
+    def test_produce_canonical_order(self):
+        lettersets_cases = [['A', 'BC', 'DEF'], ['A', 'B', 'AC'], ['A', 'BD', 'AC'], ['AB', 'C', 'D'], ['AB', 'AB'], ['AAB', 'BA', 'B'], ['ABC', 'ABC', 'BD', 'A']]
+        settings_cases = [
+            dict(permute=False),
+            dict(permute=True),
+            dict(permute=True, restrict_perms='B'),
+        ]
+        for lettersets, settings in itertools.product(lettersets_cases, settings_cases):
+            with self.subTest(lettersets=lettersets, **settings):
+                expected = list(WordProducer(**settings).produce(lettersets))
+                producer = WordProducer(canonical_order=True, **settings)
+                produced = list(producer.produce(lettersets))
+                self.assertEqual(len(produced), len(set(produced)))
+                self.assertSetEqual(set(expected), set(produced))
+                raw = list(WordProducer(allow_duplicates=True, **settings).produce(lettersets))
+                self.assertEqual(len(raw) - len(produced), producer.duplicates_avoided)
+
+    def test_restrict_perms_several_letters(self):
+        for canonical_order in (False, True):
+            with self.subTest(canonical_order=canonical_order):
+                producer = WordProducer(permute=True, restrict_perms='ab', canonical_order=canonical_order)
+                self.assertListEqual([], list(producer.produce(['ab', 'bc', 'c'])))
+                self.assertEqual(0, producer.count_raw_candidates(['ab', 'bc', 'c']))
+        self.assertListEqual([], list(GuidedWordProducer(['ABC'], permute=True, restrict_perms='ab').produce(['ab', 'bc', 'c'])))
+
+    def test_duplicates_avoided_early_stop(self):
+        for canonical_order in (False, True):
+            with self.subTest(canonical_order=canonical_order):
+                producer = WordProducer(permute=True, canonical_order=canonical_order)
+                for _ in zip(range(3), producer.produce(['AB', 'AB', 'A'])):
+                    pass
+                self.assertGreater(producer.duplicates_avoided, 0)
+
+
+class TestGuidedWordProducer(unittest.TestCase):
+
+    def test_produce_same_as_filtered(self):
+        letters = 'ABCD'
+        dictionary = set(''.join(p) for n in (2, 3, 4) for p in itertools.product(letters, repeat=n) if sum(map(ord, p)) % 3 == 0)
+        dictionary.update(['BAD', 'CAB', 'DAB', 'ABBA', 'BA', 'AB'])
+        lettersets_cases = [['A', 'B', 'AC'], ['AB', 'C', 'D'], ['AB', 'AB'], ['ABC', 'ABC', 'BD'], ['AA', 'B', 'A'], ['DC', 'BA', 'AB', 'A']]
+        settings_cases = [
+            dict(permute=False, allow_duplicates=False),
+            dict(permute=False, allow_duplicates=True),
+            dict(permute=True, allow_duplicates=False),
+            dict(permute=True, allow_duplicates=True),
+            dict(permute=True, allow_duplicates=False, restrict_perms='B'),
+            dict(permute=True, allow_duplicates=True, restrict_perms='B'),
+            dict(permute=True, allow_duplicates=True, restrict_perms='A'),
+        ]
+        for lettersets, settings in itertools.product(lettersets_cases, settings_cases):
+            with self.subTest(lettersets=lettersets, **settings):
+                expected = Counter(filter(lambda w: w in dictionary, WordProducer(**settings).produce(lettersets)))
+                actual = Counter(GuidedWordProducer(dictionary, **settings).produce(lettersets))
+                self.assertEqual(expected, actual)
+
+    def test_produce_lowercase(self):
+        producer = GuidedWordProducer(['TEA', 'SEA', 'EAT'], permute=True)
+        self.assertSetEqual({'TEA', 'SEA', 'EAT'}, set(producer.produce(['tea', 'ae', 'ts'])))
+        producer = GuidedWordProducer(['TEA', 'SEA', 'EAT'], permute=True, restrict_perms='s')
+        self.assertListEqual(['SEA'], list(producer.produce(['tea', 'ae', 'ts'])))
+
+    def test_produce_prunes(self):
+        producer = GuidedWordProducer(['CAT', 'DOG', 'COG'], permute=True)
+        lettersets = ['ABCDEFGHIJKLMNOPQRSTUVWXYZ'] * 3
+        self.assertSetEqual(set(['CAT', 'DOG', 'COG']), set(producer.produce(lettersets)))
@@ -4,7 +4,8 @@ from __future__ import print_function
 import sys
 import logging
 from argparse import ArgumentParser
-from anagrammary import LetterPool, _BLANK, _CMD_ALPHABETIZE, normalize_cmd, _SAMPLE_COMMANDS
+from anagrammary import LetterPool, SpellableWords, _BLANK, _CMD_ALPHABETIZE, _CMD_WORDS, _CMD_UNDO, normalize_cmd, _SAMPLE_COMMANDS
+from anagrammary import lookup
 
 _log = logging.getLogger()
 
@@ -15,15 +16,40 @@ def read_letters(args):
     return input("pool: ")
 
 
+def parse_count(entry, params, default):
+    """Return the count given as the first parameter of a command, or None after printing usage if it is not one."""
+    if not params:
+        return default
+    try:
+        count = int(params[0])
+    except ValueError:
+        count = -1
+    if count < 0:
+        print("usage: {} [N], where N is a whole number".format(entry.lower()), file=sys.stderr)
+        return None
+    return count
+
+
+def print_words(words, limit):
+    words = sorted(words, key=lambda w: (-len(w), w))
+    for word in words[:limit]:
+        print(word)
+    if len(words) > limit:
+        print("...and {} more".format(len(words) - limit))
+    print()
+
+
 def main():
     p = ArgumentParser()
     p.add_argument("letters", nargs='*', help="pool of letters")
+    p.add_argument("--dictionary", metavar="FILE", help="specify wordlist text file for /words")
     p.add_argument("--log-level", choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='INFO', help="set log level")
     args = p.parse_args()
     logging.basicConfig(level=logging.__dict__[args.log_level])
     letters = read_letters(args)
     pool = LetterPool.build(letters)
     previous = None
+    tracker = None
     try:
         while True:
             _log.debug("pool: %s (num_blanks = %s)", pool.letters, pool.num_blanks)
@@ -42,11 +68,17 @@ def main():
             elif entry == '/SHUFFLE' or entry == '/S':
                 if params:
                     n = int(params[0])
-                    shuffles = pool.get_shuffled(n)
-                    for s in shuffles:
-                        print(''.join(s))
-                    if len(shuffles) < n:
-                        _log.info("more shuffles requested %s than available %s", n, len(shuffles))
+                    available = pool.count_shuffled()
+                    if len(params) > 1:
+                        with open(params[1], 'w') as ofile:
+                            for s in pool.iterate_shuffled(n):
+                                print(''.join(s), file=ofile)
+                        print("wrote {} shuffles to {}".format(min(n, available), params[1]))
+                    else:
+                        for s in pool.iterate_shuffled(n):
+                            print(''.join(s))
+                    if available < n:
+                        _log.info("more shuffles requested %s than available %s", n, available)
                     print()
                 else:
                     pool.shuffle()
@@ -54,6 +86,19 @@ def main():
                 print("using blanks not supported yet", file=sys.stderr)
             elif entry == _CMD_ALPHABETIZE:
                 pool.alphabetize()
+            elif entry == _CMD_UNDO:
+                n = parse_count(entry, params, 1)
+                if n is None:
+                    continue
+                pool.undo(n)
+            elif entry == _CMD_WORDS:
+                n = parse_count(entry, params, 20)
+                if n is None:
+                    continue
+                if tracker is None:
+                    tracker = SpellableWords((puzzeme.canonical for puzzeme in lookup.load_puzzemes(args.dictionary)), pool)
+                tracker.update(pool)
+                print_words(tracker.spellable(pool.num_blanks), n)
             elif entry and entry[0] == '/':
                 print("command not recognized:", entry, file=sys.stderr)
             elif entry:
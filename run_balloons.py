@@ -5,7 +5,9 @@ import os
 import logging
 import argparse
 from wordpal import puzzicon
+from pb5 import balloons as pb5_balloons
 from pb5.balloons import WordSearcher
+from common import instrument, memory
 
 def main():
     parser = argparse.ArgumentParser()
@@ -13,8 +15,18 @@ def main():
     parser.add_argument("-l", "--log-level", choices=('DEBUG', 'INFO', 'WARN', 'ERROR'), default='INFO', help="set log level")
     parser.add_argument("-v", "--verbose", action='store_const', const='DEBUG', dest='log_level', help="set log level DEBUG")
     parser.add_argument("-n", "--length", type=int, default=3)
+    parser.add_argument("--mode", choices=pb5_balloons.MODES, default=pb5_balloons.MODE_MULTISET, help="search strategy; 'permute' searches each arrangement of balloons separately and may repeat matches")
+    parser.add_argument("--profile", nargs='?', const='-', metavar="FILE", help="write timers and counters as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-report", nargs='?', const='-', metavar="FILE", help="write structure sizes and peak allocations as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-budget", type=memory.parse_size, metavar="SIZE", help="warn before builds projected to need more than SIZE, e.g. 512M; 0 for no budget")
     args = parser.parse_args()
     logging.basicConfig(level=logging.__dict__[args.log_level])
+    if args.profile:
+        instrument.enable()
+    if args.memory_budget is not None:
+        memory.set_budget(args.memory_budget)
+    if args.memory_report:
+        memory.enable()
     searcher = WordSearcher(puzzicon.load_default_puzzemes())
     balloons = list()
     for b in args.balloons:
@@ -26,9 +38,13 @@ def main():
         else:
             balloons.append(b.strip())
     assert balloons, "no balloons provided"
-    matches = searcher.find(balloons, args.length)
+    matches = searcher.find(balloons, args.length, args.mode)
     for match in matches :
         print(match)
+    if args.profile:
+        instrument.write_report(args.profile)
+    if args.memory_report:
+        memory.write_report(args.memory_report)
     return 0
 
 if __name__ == '__main__':
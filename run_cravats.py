@@ -6,7 +6,8 @@ import sys
 import logging
 import random
 from argparse import ArgumentParser
-from pb5.cravats import WordProducer
+from pb5.cravats import WordProducer, GuidedWordProducer
+from common import instrument, memory
 import wordpal.puzzicon
 from wordpal.puzzicon import Puzzarian, Filters
 
@@ -24,9 +25,21 @@ def main():
     parser.add_argument("--print-candidates", action='store_true')
     parser.add_argument("--allow-duplicates", action='store_true')
     parser.add_argument("--starts-with")
+    parser.add_argument("--canonical-order", action='store_true', help="avoid duplicates by generating candidates in canonical order instead of remembering them")
+    parser.add_argument("--guided", action='store_true', help="only generate candidates that are dictionary words")
+    parser.add_argument("--profile", nargs='?', const='-', metavar="FILE", help="write timers and counters as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-report", nargs='?', const='-', metavar="FILE", help="write structure sizes and peak allocations as JSON to FILE, or to standard error")
+    parser.add_argument("--memory-budget", type=memory.parse_size, metavar="SIZE", help="warn before builds projected to need more than SIZE, e.g. 512M; 0 for no budget")
     args = parser.parse_args()
     logging.basicConfig(level=logging.__dict__[args.log_level])
-    producer = WordProducer(permute=args.permute, allow_duplicates=args.allow_duplicates, restrict_perms=args.starts_with)
+    if args.profile:
+        instrument.enable()
+    if args.memory_budget is not None:
+        memory.set_budget(args.memory_budget)
+    if args.memory_report:
+        memory.enable()
+    settings = dict(permute=args.permute, allow_duplicates=args.allow_duplicates, restrict_perms=args.starts_with, canonical_order=args.canonical_order)
+    producer = WordProducer(**settings)
     lettersets = args.lettersets
     if args.count:
         count = producer.count_candidates(lettersets)
@@ -34,6 +47,8 @@ def main():
     else:
         puzzemes = wordpal.puzzicon.load_default_puzzemes()
         puzzarian = Puzzarian(puzzemes)
+        if args.guided:
+            producer = GuidedWordProducer(puzzarian.puzzeme_dict.keys(), **settings)
         ncandidates, nwords = 0, 0
         for candidate in producer.produce(lettersets):
             ncandidates += 1
@@ -44,7 +59,15 @@ def main():
                 nwords += 1
             if args.limit is not None and ncandidates >= args.limit:
                 break
-        _log.debug("%d words out of %d candidates", nwords, ncandidates)
+        instrument.count('cravats.candidates', ncandidates)
+        instrument.count('cravats.hits', nwords)
+        instrument.count('cravats.duplicates_avoided', producer.duplicates_avoided)
+        _log.debug("%d words out of %d candidates (%d duplicates avoided)", nwords, ncandidates, producer.duplicates_avoided)
+    if args.profile:
+        instrument.write_report(args.profile)
+    if args.memory_report:
+        memory.account('cravats.used', producer.used)
+        memory.write_report(args.memory_report)
     return 0
 
 if __name__ == '__main__':
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+
+"""Vectorized letter-count index for batch anagram queries.
+
+Requires NumPy, which is optional; check `available()` before use.
+"""
+
+import logging
+from typing import Iterable, List, Sequence
+try:
+    import numpy
+except ModuleNotFoundError:
+    numpy = None
+
+_log = logging.getLogger(__name__)
+
+ANAGRAM = 'anagram'
+SPELLABLE = 'spellable'
+CONTAINING = 'containing'
+RELATIONS = (ANAGRAM, SPELLABLE, CONTAINING)
+
+
+def available() -> bool:
+    return numpy is not None
+
+
+def _encode(words: Sequence[str]):
+    """Return an (N, 26) matrix of letter counts, of an unsigned type wide enough for the longest word."""
+    lengths = numpy.fromiter(map(len, words), dtype=numpy.int64, count=len(words))
+    dtype = numpy.min_scalar_type(int(lengths.max())) if len(words) else numpy.uint8
+    counts = numpy.zeros((len(words), 26), dtype=dtype)
+    if not len(words):
+        return counts, lengths
+    try:
+        encoded = ''.join(words).encode('ascii')
+    except UnicodeEncodeError:
+        raise ValueError("words must consist of uppercase letters A-Z")
+    codes = numpy.frombuffer(encoded, dtype=numpy.uint8).astype(numpy.int64) - ord('A')
+    if codes.size and (codes.min() < 0 or codes.max() >= 26):
+        raise ValueError("words must consist of uppercase letters A-Z")
+    rows = numpy.repeat(numpy.arange(len(words)), lengths)
+    numpy.add.at(counts, (rows, codes), 1)
+    return counts, lengths
+
+
+class LetterCountMatrix(object):
+    """N x 26 letter-count matrix over canonical forms, sorted by length.
+
+    Each query is answered by comparing its count vector against every row
+    in the relevant length range at once.
+    """
+
+    def __init__(self, canonicals: Iterable[str]):
+        assert available(), "numpy is required for LetterCountMatrix"
+        self.canonicals = tuple(sorted(set(canonicals), key=len))
+        self.counts, self.lengths = _encode(self.canonicals)
+        _log.debug("letter count matrix has shape %s", self.counts.shape)
+
+    def _rows(self, relation, length):
+        if relation == ANAGRAM:
+            return numpy.searchsorted(self.lengths, length, 'left'), numpy.searchsorted(self.lengths, length, 'right')
+        if relation == SPELLABLE:
+            return 0, numpy.searchsorted(self.lengths, length, 'right')
+        if relation == CONTAINING:
+            return numpy.searchsorted(self.lengths, length, 'left'), len(self.canonicals)
+        raise ValueError("relation must be one of " + str(RELATIONS))
+
+    def query(self, queries: Sequence[str], relation: str=ANAGRAM) -> List[List[str]]:
+        """Answer a batch of queries, returning the matching canonicals for each.
+
+        An anagram query matches words with exactly its letters; a spellable
+        query matches words that use only its letters; a containing query
+        matches words that use at least its letters.
+        """
+        queries = [''.join(filter(str.isalpha, q.upper())) for q in queries]
+        query_counts, query_lengths = _encode(queries)
+        results = []
+        for q, length in zip(query_counts, query_lengths):
+            start, stop = self._rows(relation, length)
+            block = self.counts[start:stop]
+            if relation == ANAGRAM:
+                hits = (block == q).all(axis=1)
+            elif relation == SPELLABLE:
+                hits = (block <= q).all(axis=1)
+            else:
+                hits = (block >= q).all(axis=1)
+            results.append([self.canonicals[start + i] for i in numpy.flatnonzero(hits)])
+        return results
+
+    def anagrams(self, queries: Sequence[str]) -> List[List[str]]:
+        return self.query(queries, ANAGRAM)
+
+    def spellable(self, queries: Sequence[str]) -> List[List[str]]:
+        return self.query(queries, SPELLABLE)
+
+    def containing(self, queries: Sequence[str]) -> List[List[str]]:
+        return self.query(queries, CONTAINING)
@@ -2,19 +2,37 @@
 
 import re
 import os
+import io
+import string
 import fnmatch
+import bisect
+import operator
+import time
 import logging
-from typing import List, Tuple, Dict, Callable, Set, Iterable
+import itertools
+import concurrent.futures
+from array import array
+from collections import defaultdict, OrderedDict
+from collections.abc import Mapping, Sequence
+from typing import List, Tuple, Dict, Callable, Set, Iterable, Iterator
 try:
     import unidecode
     unicode_normalize = unidecode.unidecode
 except ModuleNotFoundError:
     import unicodedata
     unicode_normalize = lambda input_str: unicodedata.normalize('NFKD', input_str).encode('ASCII', 'ignore')
+try:
+    from re import _parser as _sre_parser, _constants as _sre_constants
+except ImportError:
+    import sre_parse as _sre_parser, sre_constants as _sre_constants
+from common import instrument, memory
+from . import snapshot
+from . import countmatrix
 
 _log = logging.getLogger(__name__)
 
 _IDENTITY = lambda x: x
+_NO_LETTERS = lambda canonical: ()
 
 def _create_constant_callable(retval):
     def _constant(*args, **kwargs):
@@ -24,6 +42,17 @@ def _create_constant_callable(retval):
 _CALLABLE_TRUE = _create_constant_callable(True)
 _CALLABLE_FALSE = _create_constant_callable(False)
 _ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz"
+_WILDCARD_SPECIALS = '*?['
+_CHUNK_LINES = 1 << 16
+_PARALLEL_MIN_BYTES = 16 << 20
+# deletes every ASCII character but letters and newlines
+_ASCII_NONALPHA = dict.fromkeys(c for c in range(128) if not chr(c).isalpha() and chr(c) != '\n')
+# the ASCII fast path is only equivalent if normalization leaves ASCII text alone
+_ASCII_NORMALIZE_IS_IDENTITY = unicode_normalize(string.printable) == string.printable
+DEFAULT_WORDLIST = '/usr/share/dict/words'
+# caching is opt-in: a cached search hands out an iterator over a shared result tuple
+DEFAULT_CACHE_SIZE = 0
+_ESTIMATES_SIZE = 4096
 
 def _contains_nonalphabet(letters):
     for l in letters:
@@ -33,19 +62,31 @@ def _contains_nonalphabet(letters):
 
 class Puzzeme(tuple):
     
-    """Thing that might be an answer to a clue in a puzzle."""
+    """Thing that might be an answer to a clue in a puzzle.
+
+    A puzzeme is a (canonical, rendering) pair. It has no instance
+    dictionary; the attributes are views of the tuple items.
+    """
+
+    __slots__ = ()
 
-    canonical, rendering = None, None
+    canonical = property(operator.itemgetter(0))
+    rendering = property(operator.itemgetter(1))
 
     def __new__(cls, rendering: str):
         rendering = rendering.strip()
         assert rendering, "lexeme rendering must contain non-whitespace"
         canonical = Puzzeme.canonicalize(rendering)
         assert canonical, "canonical form of lexeme must contain non-whitespace: {}".format(repr(rendering)[:64])
-        instance = super(Puzzeme, cls).__new__(cls, [canonical, rendering])
-        instance.canonical = canonical
-        instance.rendering = rendering
-        return instance
+        return super(Puzzeme, cls).__new__(cls, (canonical, rendering))
+
+    @classmethod
+    def restore(cls, canonical: str, rendering: str):
+        """Create an instance from an already-canonicalized form."""
+        return tuple.__new__(cls, (canonical, rendering))
+
+    def __reduce__(self):
+        return Puzzeme.restore, tuple(self)
     
     @classmethod
     def canonicalize(cls, rendering):
@@ -59,79 +100,1003 @@ class Puzzeme(tuple):
         return len(self.canonical)
 
 
+class PuzzemeTable(object):
+    """Distinct puzzemes stored column-wise in contiguous buffers.
+
+    Canonical forms are kept as ASCII in one buffer and renderings as UTF-8
+    in another, each with an array of row offsets, so a row costs its text
+    plus eight bytes instead of a tuple and two string objects. Rows are
+    sorted by canonical form, then rendering, and are identified by index.
+    Indexing or iterating the table creates Puzzeme instances on demand.
+    """
+
+    def __init__(self, canonicals: bytes, canonical_offsets: array, renderings: bytes, rendering_offsets: array):
+        assert len(canonical_offsets) == len(rendering_offsets), "offset arrays must have the same length"
+        self._canonicals = canonicals
+        self._canonical_offsets = canonical_offsets
+        self._renderings = renderings
+        self._rendering_offsets = rendering_offsets
+
+    @staticmethod
+    def _pack(values: Iterable[bytes]):
+        offsets = array('I', [0])
+        buffer = bytearray()
+        for value in values:
+            buffer += value
+            offsets.append(len(buffer))
+        return bytes(buffer), offsets
+
+    @classmethod
+    def from_columns(cls, canonicals: Iterable[str], renderings: Iterable[str]):
+        rows = sorted(set(zip(canonicals, renderings)))
+        canonical_buffer, canonical_offsets = cls._pack(c.encode('ascii') for c, _ in rows)
+        rendering_buffer, rendering_offsets = cls._pack(r.encode('utf-8') for _, r in rows)
+        return PuzzemeTable(canonical_buffer, canonical_offsets, rendering_buffer, rendering_offsets)
+
+    @classmethod
+    def build(cls, puzzemes: Iterable[Puzzeme]):
+        puzzemes = list(puzzemes)
+        return cls.from_columns((p.canonical for p in puzzemes), (p.rendering for p in puzzemes))
+
+    def __len__(self):
+        return len(self._canonical_offsets) - 1
+
+    def canonical(self, i: int) -> str:
+        return self._canonicals[self._canonical_offsets[i]:self._canonical_offsets[i + 1]].decode('ascii')
+
+    def rendering(self, i: int) -> str:
+        return self._renderings[self._rendering_offsets[i]:self._rendering_offsets[i + 1]].decode('utf-8')
+
+    def __getitem__(self, i: int) -> Puzzeme:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("row index out of range")
+        return Puzzeme.restore(self.canonical(i), self.rendering(i))
+
+    def __iter__(self):
+        return map(self.__getitem__, range(len(self)))
+
+    def canonicals(self):
+        """Yield the canonical form of each row."""
+        return map(self.canonical, range(len(self)))
+
+    def _bisect(self, key: bytes) -> int:
+        """Return the first row whose canonical form is not less than the key."""
+        buffer, offsets = self._canonicals, self._canonical_offsets
+        lo, hi = 0, len(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if buffer[offsets[mid]:offsets[mid + 1]] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, canonical: str) -> range:
+        """Return the ids of the rows with the given canonical form."""
+        key = canonical.encode('ascii', 'replace')
+        start = lo = self._bisect(key)
+        buffer, offsets = self._canonicals, self._canonical_offsets
+        while lo < len(self) and buffer[offsets[lo]:offsets[lo + 1]] == key:
+            lo += 1
+        return range(start, lo)
+
+    def find_prefix(self, prefix: str) -> range:
+        """Return the ids of the rows whose canonical forms start with the prefix."""
+        key = prefix.encode('ascii', 'replace')
+        if not key:
+            return range(len(self))
+        return range(self._bisect(key), self._bisect(key[:-1] + bytes([key[-1] + 1])))
+
+    def __contains__(self, puzzeme):
+        if not isinstance(puzzeme, tuple) or len(puzzeme) != 2:
+            return False
+        return any(self.rendering(i) == puzzeme[1] for i in self.find(puzzeme[0]))
+
+
+class _TableRows(Sequence):
+    """Rows of a table, selected by id, as a sequence of puzzemes."""
+
+    __slots__ = ('table', 'ids')
+
+    def __init__(self, table: PuzzemeTable, ids):
+        self.table = table
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, k):
+        if isinstance(k, slice):
+            return _TableRows(self.table, self.ids[k])
+        return self.table[self.ids[k]]
+
+    def __iter__(self):
+        return map(self.table.__getitem__, self.ids)
+
+
+class _CanonicalIndex(Mapping):
+    """Map each canonical form in a table to the rows that have it."""
+
+    def __init__(self, table: PuzzemeTable):
+        self.table = table
+        self._size = sum(1 for _ in self)
+
+    def __getitem__(self, canonical):
+        ids = self.table.find(canonical) if isinstance(canonical, str) else ()
+        if not ids:
+            raise KeyError(canonical)
+        return _TableRows(self.table, ids)
+
+    def __iter__(self):
+        previous = None
+        for canonical in self.table.canonicals():
+            if canonical != previous:
+                yield canonical
+                previous = canonical
+
+    def __len__(self):
+        return self._size
+
+
+class _CanonicalDict(_CanonicalIndex):
+    """Map each canonical form in a table to one puzzeme that has it."""
+
+    def __getitem__(self, canonical):
+        return super(_CanonicalDict, self).__getitem__(canonical)[0]
+
+
+def letter_mask(letters: str) -> int:
+    """Return a bitmask with one bit set for each uppercase letter present."""
+    mask = 0
+    for ch in letters:
+        if 'A' <= ch <= 'Z':
+            mask |= 1 << (ord(ch) - 65)
+    return mask
+
+
+def _parse_wildcard(pattern: str):
+    """Split a wildcard pattern into tokens.
+
+    Each token is a literal character, '?', '*', or a character class in
+    brackets. Unclosed brackets are literal, as in fnmatch.
+    """
+    tokens, i, n = [], 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if ch == '[':
+            j = i + 1
+            if j < n and pattern[j] == '!':
+                j += 1
+            if j < n and pattern[j] == ']':
+                j += 1
+            while j < n and pattern[j] != ']':
+                j += 1
+            if j < n:
+                tokens.append(pattern[i:j + 1])
+                i = j + 1
+                continue
+        tokens.append(ch)
+        i += 1
+    return tokens
+
+
+def _is_wildcard_literal(token: str) -> bool:
+    return len(token) == 1 and token not in _WILDCARD_SPECIALS
+
+
+def _is_positional(tokens) -> bool:
+    """Check whether a tokenized pattern has only literals and '?' wildcards."""
+    return all(t == '?' or _is_wildcard_literal(t) for t in tokens)
+
+
+def _leading(items, accept):
+    """Return the leading items that the accept function accepts."""
+    return list(itertools.takewhile(accept, items))
+
+
+def _wildcard_conditions(tokens) -> Dict:
+    """Derive necessary conditions on matching canonicals from a tokenized wildcard pattern."""
+    nfixed = sum(1 for t in tokens if t != '*')
+    return {
+        'min_length': nfixed,
+        'max_length': None if '*' in tokens else nfixed,
+        'prefix': ''.join(_leading(tokens, _is_wildcard_literal)),
+        'suffix': ''.join(reversed(_leading(reversed(tokens), _is_wildcard_literal))),
+        'letters': ''.join(filter(_is_wildcard_literal, tokens)),
+    }
+
+
+def _required_literals(items):
+    """Yield the literal characters that any match of parsed regex items must contain."""
+    for op, av in items:
+        if op is _sre_constants.LITERAL:
+            yield chr(av)
+        elif op is _sre_constants.SUBPATTERN and not av[1] & re.IGNORECASE:
+            yield from _required_literals(av[-1])
+        elif op in (_sre_constants.MAX_REPEAT, _sre_constants.MIN_REPEAT) and av[0] >= 1:
+            yield from _required_literals(av[2])
+
+
+def _regex_conditions(pattern: str) -> Dict:
+    """Derive necessary conditions on fully matching canonicals from a regular expression."""
+    parsed = _sre_parser.parse(pattern)
+    min_length, max_length = parsed.getwidth()
+    conditions = {
+        'min_length': min_length,
+        'max_length': max_length if max_length < _sre_constants.MAXREPEAT - 1 else None,
+        'prefix': '',
+        'suffix': '',
+        'letters': '',
+    }
+    if parsed.state.flags & re.IGNORECASE:
+        return conditions
+    is_anchor = lambda item: item[0] is _sre_constants.AT
+    is_literal = lambda item: item[0] is _sre_constants.LITERAL
+    items = list(parsed)
+    forwards = items[len(_leading(items, is_anchor)):]
+    conditions['prefix'] = ''.join(chr(av) for _, av in _leading(forwards, is_literal))
+    backwards = items[::-1]
+    backwards = backwards[len(_leading(backwards, is_anchor)):]
+    conditions['suffix'] = ''.join(chr(av) for _, av in reversed(_leading(backwards, is_literal)))
+    conditions['letters'] = ''.join(_required_literals(items))
+    return conditions
+
+
+def _condition_hints(conditions: Dict):
+    """Return the index hints implied by a set of conditions."""
+    hints = []
+    min_length, max_length = conditions['min_length'], conditions['max_length']
+    if min_length == max_length:
+        hints.append(('stature', min_length))
+    elif min_length > 0 or max_length is not None:
+        hints.append(('length', (min_length, max_length)))
+    prefix, suffix = conditions['prefix'], conditions['suffix']
+    if len(prefix) > 1:
+        hints.append(('prefix', prefix))
+    elif prefix:
+        hints.append(('first', prefix))
+    if suffix:
+        hints.append(('last', suffix[-1]))
+    mask = letter_mask(conditions['letters'])
+    if mask:
+        hints.append(('letters', mask))
+    return hints
+
+
+def _length_check(conditions: Dict):
+    min_length, max_length = conditions['min_length'], conditions['max_length']
+    if max_length is None:
+        return lambda c: len(c) >= min_length
+    return lambda c: min_length <= len(c) <= max_length
+
+
+def _wildcard_matcher(pattern: str):
+    """Return a function that matches a canonical against a wildcard pattern.
+
+    The pattern is compiled on first use, because searches answered from
+    an index bucket that is empty or cached never call it.
+    """
+    match = None
+    def _match(canonical):
+        nonlocal match
+        if match is None:
+            match = re.compile(fnmatch.translate(pattern)).match
+        return match(canonical) is not None
+    return _match
+
+
+_BYTE_BITS = tuple(tuple(i for i in range(8) if b & (1 << i)) for b in range(256))
+
+
+def _bitset(ids: Iterable[int], size: int) -> int:
+    buffer = bytearray((size + 7) // 8)
+    for i in ids:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, 'little')
+
+
+def _iterate_bits(bits: int, size: int):
+    buffer = bits.to_bytes((size + 7) // 8, 'little')
+    for offset, b in enumerate(buffer):
+        if b:
+            base = offset << 3
+            for i in _BYTE_BITS[b]:
+                yield base + i
+
+
+class PositionalIndex(object):
+    """Bitsets of puzzemes keyed by (length, position, letter).
+
+    Puzzemes are grouped by stature, and each group has its own id space,
+    so the bitsets for a given length are only as wide as the number of
+    puzzemes of that length. A pattern made of literal letters and '?'
+    wildcards is answered by intersecting one bitset per literal.
+    """
+
+    def __init__(self, puzzemes: Iterable[Puzzeme]):
+        if isinstance(puzzemes, PuzzemeTable):
+            groups = defaultdict(lambda: array('I'))
+            for i, canonical in enumerate(puzzemes.canonicals()):
+                groups[len(canonical)].append(i)
+            self.groups = dict((length, _TableRows(puzzemes, ids)) for length, ids in groups.items())
+        else:
+            groups = defaultdict(list)
+            for p in puzzemes:
+                groups[len(p.canonical)].append(p)
+            self.groups = dict((length, tuple(group)) for length, group in groups.items())
+        self.bitsets = {}
+        for length, group in self.groups.items():
+            positions = defaultdict(list)
+            for i, p in enumerate(group):
+                for position, letter in enumerate(p.canonical):
+                    positions[(position, letter)].append(i)
+            for (position, letter), ids in positions.items():
+                self.bitsets[(length, position, letter)] = _bitset(ids, len(group))
+
+    def match(self, pattern: str):
+        """Return the puzzemes whose canonical forms match a pattern.
+
+        Return None if the pattern contains anything other than literal
+        characters and '?' wildcards.
+        """
+        if not _is_positional(_parse_wildcard(pattern)):
+            return None
+        group, bits = self._match_bits(pattern)
+        if not bits:
+            return ()
+        return tuple(group[i] for i in _iterate_bits(bits, len(group)))
+
+    def count(self, pattern: str) -> int:
+        """Return the number of puzzemes that match() would return for a positional pattern."""
+        return bin(self._match_bits(pattern)[1]).count('1')
+
+    def _match_bits(self, pattern: str):
+        length = len(pattern)
+        group = self.groups.get(length, ())
+        bits = (1 << len(group)) - 1
+        for position, letter in enumerate(pattern):
+            if letter != '?':
+                bits &= self.bitsets.get((length, position, letter), 0)
+                if not bits:
+                    break
+        return group, bits
+
+
+class Filter(object):
+    """Declarative predicate on puzzemes.
+
+    The key names what the filter accepts, e.g. ('stature', 5) or
+    ('wildcard', 'B?T'), so filters are compared and hashed by key and
+    their search results can be cached. The hints are (kind, key) tuples
+    naming Puzzarian index buckets that contain every puzzeme the filter
+    accepts.
+    """
+
+    __slots__ = ('key', 'hints', '_predicate')
+
+    def __init__(self, key: Tuple, predicate: Callable[[Puzzeme], bool], hints=()):
+        self.key = key
+        self.hints = tuple(hints)
+        self._predicate = predicate
+
+    def __call__(self, puzzeme) -> bool:
+        return self._predicate(puzzeme)
+
+    def __eq__(self, other):
+        return isinstance(other, Filter) and self.key == other.key
+
+    def __hash__(self):
+        return hash(self.key)
+
+    def __repr__(self):
+        return "Filter{!r}".format(self.key)
+
+
+class AdaptiveConjunction(object):
+    """Predicate accepting what all of a list of predicates accept.
+
+    The predicates are evaluated in an order that adapts to how they
+    behave. Every SAMPLE_INTERVAL-th puzzeme, starting with the first, the
+    predicates evaluated are timed and their passes counted, and then
+    sorted by mean cost divided by rejection rate, so that cheap and
+    selective predicates come first. Every puzzeme, sampled or not, stops
+    at the first rejection.
+
+    Only Filter instances, which accept or reject any puzzeme without
+    side effects, are reordered, and only among consecutive Filters; any
+    other predicate is evaluated after all the predicates given before it,
+    so that those can guard it. The statistics are not synchronized, so
+    use one instance per search.
+    """
+
+    SAMPLE_INTERVAL = 64
+
+    def __init__(self, predicates: Iterable[Callable[[Puzzeme], bool]]):
+        self.predicates = list(predicates)
+        self.calls = 0
+        self._evaluations = [0] * len(self.predicates)
+        self._seconds = [0.0] * len(self.predicates)
+        self._passes = [0] * len(self.predicates)
+        self._runs = []
+        for i, predicate in enumerate(self.predicates):
+            if isinstance(predicate, Filter) and self._runs and self._runs[-1][1]:
+                self._runs[-1][0].append(i)
+            else:
+                self._runs.append(([i], isinstance(predicate, Filter)))
+        self._order = list(range(len(self.predicates)))
+
+    def __call__(self, puzzeme) -> bool:
+        self.calls += 1
+        if self.calls % self.SAMPLE_INTERVAL == 1 or self.SAMPLE_INTERVAL == 1:
+            return self._sample(puzzeme)
+        predicates = self.predicates
+        for i in self._order:
+            if not predicates[i](puzzeme):
+                return False
+        return True
+
+    def _sample(self, puzzeme) -> bool:
+        accepted = True
+        for i in self._order:
+            start = time.perf_counter()
+            passed = self.predicates[i](puzzeme)
+            self._seconds[i] += time.perf_counter() - start
+            self._evaluations[i] += 1
+            if not passed:
+                accepted = False
+                break
+            self._passes[i] += 1
+        order = []
+        for run, reorderable in self._runs:
+            order.extend(sorted(run, key=self._rank) if reorderable else run)
+        self._order = order
+        return accepted
+
+    def _rank(self, i: int) -> float:
+        evaluations = self._evaluations[i]
+        if not evaluations:
+            return float('inf')
+        rejection_rate = 1 - self._passes[i] / evaluations
+        cost = self._seconds[i] / evaluations
+        return cost / rejection_rate if rejection_rate > 0 else float('inf')
+
+    def ordering(self) -> List[Callable[[Puzzeme], bool]]:
+        """Return the predicates in the order they are currently evaluated."""
+        return [self.predicates[i] for i in self._order]
+
+    def report(self) -> List[Dict]:
+        """Describe each predicate, in evaluation order, with its sampled cost and pass rate."""
+        return [{
+            'predicate': repr(self.predicates[i]),
+            'position': i,
+            'evaluations': self._evaluations[i],
+            'cost_us': self._seconds[i] / self._evaluations[i] * 1e6 if self._evaluations[i] else None,
+            'pass_rate': self._passes[i] / self._evaluations[i] if self._evaluations[i] else None,
+        } for i in self._order]
+
+
+class _Conjunction(Filter):
+    """Filter accepting what all its children accept.
+
+    The key does not depend on the order or repetition of the children.
+    """
+
+    __slots__ = ('children',)
+
+    def __init__(self, children: List[Filter]):
+        self.children = children
+        key = ('and', tuple(sorted((c.key for c in children), key=repr)))
+        super(_Conjunction, self).__init__(key, self._all, itertools.chain.from_iterable(c.hints for c in children))
+
+    def _all(self, puzzeme):
+        for child in self.children:
+            if not child(puzzeme):
+                return False
+        return True
+
+    def adaptive(self) -> AdaptiveConjunction:
+        """Return a new predicate that evaluates the children in an adaptive order."""
+        return AdaptiveConjunction(self.children)
+
+
+def _conjunction(filters: List[Filter]) -> Filter:
+    children = []
+    for f in filters:
+        children.extend(f.children if isinstance(f, _Conjunction) else (f,))
+    children = list(OrderedDict.fromkeys(children))
+    return children[0] if len(children) == 1 else _Conjunction(children)
+
+
 class Filters(object):
 
     @classmethod
     def stature(cls, int_predicate: Callable[[int], bool]):
         if isinstance(int_predicate, int):
             value = int_predicate
-            int_predicate = lambda n: n == value
+            return Filter(('stature', value), lambda p: p.stature() == value, [('stature', value)])
         return lambda p: int_predicate(p.stature())
     
     @classmethod
     def conjoin(cls, predicates: Iterable[Callable[[Puzzeme], bool]]):
+        """Return a predicate that accepts what all the predicates accept.
+
+        The conjunction of Filter instances is itself a Filter, whose
+        adaptive() method returns a predicate that reorders them as it runs;
+        for other predicates, an AdaptiveConjunction is returned.
+        """
         if not predicates:
             return _CALLABLE_TRUE
-        def _and(puzzeme):
-            for predicate in predicates:
-                if not predicate(puzzeme):
-                    return False
-            return True
-        return _and
+        if all(isinstance(p, Filter) for p in predicates):
+            return _conjunction(predicates)
+        return AdaptiveConjunction(predicates)
     
     @classmethod
     def canonical(cls, predicate):
         if not callable(predicate):
             # assume we're looking for literal match
             literal = Puzzeme.canonicalize(predicate)
-            predicate = lambda c: c == literal
+            return Filter(('canonical', literal), lambda p: p.canonical == literal, [('canonical', literal)])
         return lambda p: predicate(p.canonical)
     
     @classmethod
     def canonical_wildcard(cls, pattern):
-        return Filters.canonical(lambda c: fnmatch.fnmatch(c, pattern))
+        tokens = _parse_wildcard(pattern)
+        match = _wildcard_matcher(pattern)
+        if _is_positional(tokens):
+            return Filter(('wildcard', pattern), lambda p: match(p.canonical), [('wildcard', pattern)])
+        conditions = _wildcard_conditions(tokens)
+        check = _length_check(conditions)
+        return Filter(('wildcard', pattern), lambda p: check(p.canonical) and match(p.canonical), _condition_hints(conditions))
 
     @classmethod    
     def canonical_regex(cls, pattern):
-        return Filters.canonical(lambda c: re.fullmatch(pattern, c) is not None)
+        conditions = _regex_conditions(pattern)
+        check = _length_check(conditions)
+        fullmatch = re.compile(pattern).fullmatch
+        return Filter(('regex', pattern), lambda p: check(p.canonical) and fullmatch(p.canonical) is not None, _condition_hints(conditions))
 
 
 class Puzzarian(object):
-    """Librarian who can find the puzzemes you desire."""
+    """Librarian who can find the puzzemes you desire.
+
+    The puzzemes may be a set or a PuzzemeTable. Indexes over a table hold
+    row ids rather than puzzemes. If cache_size is positive, results of
+    searches made only of Filter instances are kept in a least-recently-used
+    cache of that many entries, keyed by the conjunction of the filters.
+    Caching is off by default; enable it for callers that repeat searches.
+    """
 
-    def __init__(self, puzzeme_set: Set[Puzzeme]):
+    def __init__(self, puzzeme_set: Set[Puzzeme], cache_size: int=DEFAULT_CACHE_SIZE):
+        self.cache_size = cache_size
+        self._results = OrderedDict()
+        self.cache_hits, self.cache_misses, self.cache_evictions = 0, 0, 0
+        self.reindex(puzzeme_set)
+
+    def reindex(self, puzzeme_set: Set[Puzzeme]):
+        """Replace the puzzemes, rebuilding the indexes and invalidating cached results."""
+        with instrument.timer('index.puzzarian'), memory.peak('index.puzzarian'):
+            if isinstance(puzzeme_set, PuzzemeTable):
+                self._index_table(puzzeme_set)
+            else:
+                self._index_set(puzzeme_set)
+        memory.account('puzzarian.puzzemes', self.puzzemes)
+        memory.account('puzzarian.puzzeme_dict', self.puzzeme_dict)
+        memory.account('puzzarian.indexes', self.indexes, len(self.puzzemes))
+        self._positional_index = None
+        self._count_matrix = None
+        self._sorted_canonicals = None
+        self._estimates = {}
+        self.invalidate()
+
+    def add(self, puzzemes: Iterable[Puzzeme]):
+        assert not isinstance(self.puzzemes, PuzzemeTable), "a table cannot be extended"
+        self.reindex(self.puzzemes.union(puzzemes))
+
+    def invalidate(self):
+        """Discard all cached search results."""
+        self._results.clear()
+
+    def cache_info(self) -> Dict[str, int]:
+        return {
+            'hits': self.cache_hits,
+            'misses': self.cache_misses,
+            'evictions': self.cache_evictions,
+            'size': len(self._results),
+            'capacity': self.cache_size,
+        }
+
+    def _index_set(self, puzzeme_set):
         self.puzzemes = frozenset(puzzeme_set)
         self.puzzeme_dict = {}
+        indexes = dict((kind, defaultdict(list)) for kind in ('canonical', 'stature', 'first', 'last', 'letters'))
         for p in self.puzzemes:
-            self.puzzeme_dict[p.canonical] = p
+            canonical = p.canonical
+            self.puzzeme_dict[canonical] = p
+            indexes['canonical'][canonical].append(p)
+            indexes['stature'][len(canonical)].append(p)
+            indexes['first'][canonical[0]].append(p)
+            indexes['last'][canonical[-1]].append(p)
+            indexes['letters'][letter_mask(canonical)].append(p)
+        self.indexes = dict((kind, dict((key, tuple(bucket)) for key, bucket in index.items())) for kind, index in indexes.items())
+
+    def _index_table(self, table):
+        self.puzzemes = table
+        self.puzzeme_dict = _CanonicalDict(table)
+        indexes = dict((kind, defaultdict(lambda: array('I'))) for kind in ('stature', 'first', 'last', 'letters'))
+        for i, canonical in enumerate(table.canonicals()):
+            indexes['stature'][len(canonical)].append(i)
+            indexes['first'][canonical[0]].append(i)
+            indexes['last'][canonical[-1]].append(i)
+            indexes['letters'][letter_mask(canonical)].append(i)
+        self.indexes = dict((kind, dict((key, _TableRows(table, ids)) for key, ids in index.items())) for kind, index in indexes.items())
+        self.indexes['canonical'] = _CanonicalIndex(table)
+
+    @property
+    def positional_index(self) -> PositionalIndex:
+        """Return the positional index, building it on first use."""
+        if self._positional_index is None:
+            with instrument.timer('index.positional'), memory.peak('index.positional'):
+                self._positional_index = PositionalIndex(self.puzzemes)
+            memory.account('puzzarian.positional_index', self._positional_index, len(self.puzzemes))
+        return self._positional_index
+
+    def _prefix_bucket(self, prefix):
+        if isinstance(self.puzzemes, PuzzemeTable):
+            return _TableRows(self.puzzemes, self.puzzemes.find_prefix(prefix))
+        by_canonical = self.indexes['canonical']
+        return list(itertools.chain.from_iterable(by_canonical[c] for c in self._prefix_canonicals(prefix)))
+
+    def _prefix_canonicals(self, prefix):
+        if self._sorted_canonicals is None:
+            self._sorted_canonicals = sorted(self.indexes['canonical'])
+        start = bisect.bisect_left(self._sorted_canonicals, prefix)
+        stop = bisect.bisect_left(self._sorted_canonicals, prefix[:-1] + chr(ord(prefix[-1]) + 1))
+        return self._sorted_canonicals[start:stop]
+
+    def _prefix_size(self, prefix) -> int:
+        by_canonical = self.indexes['canonical']
+        return sum(len(by_canonical[c]) for c in self._prefix_canonicals(prefix))
+
+    def _bucket(self, hint):
+        kind, key = hint
+        if kind == 'wildcard':
+            return self.positional_index.match(key)
+        if kind == 'letters':
+            buckets = [bucket for mask, bucket in self.indexes[kind].items() if mask & key == key]
+            return list(itertools.chain.from_iterable(buckets))
+        if kind == 'length':
+            min_length, max_length = key
+            buckets = [bucket for length, bucket in self.indexes['stature'].items() if min_length <= length and (max_length is None or length <= max_length)]
+            return list(itertools.chain.from_iterable(buckets))
+        if kind == 'prefix':
+            return self._prefix_bucket(key)
+        return self.indexes[kind].get(key, ())
+
+    def _estimate(self, hint) -> int:
+        """Return the size of the bucket of a hint without building it."""
+        kind, key = hint
+        if kind == 'wildcard':
+            return self.positional_index.count(key)
+        if kind in ('letters', 'length'):
+            try:
+                return self._estimates[hint]
+            except KeyError:
+                pass
+            if kind == 'letters':
+                size = sum(len(bucket) for mask, bucket in self.indexes[kind].items() if mask & key == key)
+            else:
+                min_length, max_length = key
+                size = sum(len(bucket) for length, bucket in self.indexes['stature'].items() if min_length <= length and (max_length is None or length <= max_length))
+            if len(self._estimates) >= _ESTIMATES_SIZE:
+                self._estimates.clear()
+            self._estimates[hint] = size
+            return size
+        if kind == 'prefix':
+            return len(self._prefix_bucket(key)) if isinstance(self.puzzemes, PuzzemeTable) else self._prefix_size(key)
+        return len(self.indexes[kind].get(key, ()))
+
+    def plan(self, predicates):
+        """Return (hint, size) pairs for the hints of the predicates, smallest bucket first.
+
+        Sizes are estimated without building the buckets, and hints whose
+        buckets hold every puzzeme are left out. The last pair is
+        (None, number of puzzemes), the full scan.
+        """
+        total = len(self.puzzemes)
+        steps = []
+        for predicate in predicates:
+            for hint in getattr(predicate, 'hints', ()):
+                size = self._estimate(hint)
+                if size < total:
+                    steps.append((hint, size))
+        steps.sort(key=lambda step: step[1])
+        steps.append((None, total))
+        return steps
+
+    def candidates(self, predicates):
+        """Return the smallest index bucket that the predicates' hints allow; only that bucket is built."""
+        hint = self.plan(predicates)[0][0]
+        return self.puzzemes if hint is None else self._bucket(hint)
+
+    def explain(self, predicates) -> str:
+        """Describe the plan of a search: each way to narrow the candidates and how many it yields."""
+        lines = []
+        for i, (hint, size) in enumerate(self.plan(predicates)):
+            if hint is None:
+                source = 'full scan'
+            elif hint[0] == 'letters':
+                source = "letters {}".format(''.join(chr(65 + b) for b in range(26) if hint[1] & (1 << b)))
+            else:
+                source = "{} {!r}".format(*hint)
+            lines.append("{} {}: {} candidates".format('*' if i == 0 else ' ', source, size))
+        lines.append("then {} predicate(s) on each candidate".format(len(predicates)))
+        return '\n'.join(lines)
     
+    def _cached_search(self, conjunction: Filter):
+        key = conjunction.key
+        try:
+            results = self._results[key]
+        except KeyError:
+            pass
+        else:
+            self._results.move_to_end(key)
+            self.cache_hits += 1
+            instrument.count('search_cache.hits')
+            return results
+        self.cache_misses += 1
+        instrument.count('search_cache.misses')
+        predicate = conjunction.adaptive() if isinstance(conjunction, _Conjunction) else conjunction
+        results = tuple(filter(predicate, self.candidates([conjunction])))
+        self._results[key] = results
+        while len(self._results) > self.cache_size:
+            self._results.popitem(last=False)
+            self.cache_evictions += 1
+            instrument.count('search_cache.evictions')
+        return results
+
     def search(self, predicates, offset=None, limit=None):
         xform = _IDENTITY if offset is None and limit is None else lambda f: (list(f))[offset:offset+limit]
-        filtered = filter(Filters.conjoin(predicates), self.puzzemes)
+        conjunction = Filters.conjoin(predicates)
+        if self.cache_size > 0 and isinstance(conjunction, Filter):
+            return xform(iter(self._cached_search(conjunction)))
+        if isinstance(conjunction, _Conjunction):
+            conjunction = conjunction.adaptive()
+        filtered = filter(conjunction, self.candidates(predicates))
         return xform(filtered)
     
+    def search_many(self, patterns: Iterable[str]) -> List[Tuple[Puzzeme, ...]]:
+        """Search for the canonicals matching each of many wildcard patterns.
+
+        Return the matches of each pattern, in the order of the patterns.
+        Patterns made only of literals and '?' are grouped by length and by
+        which positions are fixed, and each length is answered by a single
+        pass over the puzzemes of that length, in which the letters at each
+        group's fixed positions are looked up among the group's patterns.
+        Other patterns are searched for one at a time.
+        """
+        patterns = list(patterns)
+        instrument.count('search_many.patterns', len(patterns))
+        results = {}
+        groups = defaultdict(lambda: defaultdict(lambda: defaultdict(list)))
+        with instrument.timer('search_many'):
+            for pattern in set(patterns):
+                tokens = _parse_wildcard(pattern)
+                if not _is_positional(tokens):
+                    results[pattern] = tuple(self.search([Filters.canonical_wildcard(pattern)]))
+                    continue
+                positions = tuple(i for i, token in enumerate(tokens) if token != '?')
+                letters = operator.itemgetter(*positions)(tokens) if positions else ()
+                groups[len(tokens)][positions][letters].append(pattern)
+                results[pattern] = []
+            for length, by_positions in groups.items():
+                lookups = [(operator.itemgetter(*positions) if positions else _NO_LETTERS, by_letters) for positions, by_letters in by_positions.items()]
+                for puzzeme in self.indexes['stature'].get(length, ()):
+                    canonical = puzzeme.canonical
+                    for letters_of, by_letters in lookups:
+                        for pattern in by_letters.get(letters_of(canonical), ()):
+                            results[pattern].append(puzzeme)
+            results = dict((pattern, tuple(matches)) for pattern, matches in results.items())
+        return [results[pattern] for pattern in patterns]
+
+    @property
+    def count_matrix(self) -> countmatrix.LetterCountMatrix:
+        """Return the NumPy letter-count matrix, building it on first use."""
+        if self._count_matrix is None:
+            with instrument.timer('index.count_matrix'):
+                self._count_matrix = countmatrix.LetterCountMatrix(self.indexes['canonical'].keys())
+        return self._count_matrix
+
+    def search_letters(self, queries, relation=countmatrix.ANAGRAM):
+        """Answer a batch of letter-count queries with the count matrix.
+
+        Return a list with the puzzemes matching each query, where the
+        relation is one of countmatrix.RELATIONS. Requires numpy.
+        """
+        by_canonical = self.indexes['canonical']
+        return [list(itertools.chain.from_iterable(by_canonical[c] for c in hits)) for hits in self.count_matrix.query(queries, relation)]
+
     def has_canonical(self, word):
         """Check for an exact match."""
         return Puzzeme.canonicalize(word) in self.puzzeme_dict
 
 
+def _fast_canonical(rendering: str):
+    """Return the canonical form of a stripped ASCII rendering, or None if it needs the general path."""
+    if rendering.isascii():
+        if rendering.isalpha():
+            return rendering.upper()
+        if _ASCII_NORMALIZE_IS_IDENTITY:
+            return rendering.translate(_ASCII_NONALPHA).upper()
+    return None
+
+
+def _canonicalize_lines(lines: List[str]):
+    """Canonicalize a chunk of lines at once.
+
+    Return the canonical forms and renderings of the lines that are
+    tolerable, and (line, exception) pairs for those that are not, exactly
+    as constructing a Puzzeme from each line would. A chunk of ASCII text is
+    canonicalized with one translate call; lines the fast paths cannot
+    handle go through the Puzzeme constructor.
+    """
+    renderings = [line.strip() for line in lines]
+    canonicals = None
+    if _ASCII_NORMALIZE_IS_IDENTITY:
+        text = '\n'.join(renderings)
+        if text.isascii():
+            canonicals = text.translate(_ASCII_NONALPHA).upper().split('\n')
+            if len(canonicals) != len(renderings):
+                canonicals = None
+    if canonicals is None:
+        canonicals = list(map(_fast_canonical, renderings))
+    tolerable_canonicals, tolerable_renderings, failures = [], [], []
+    for line, rendering, canonical in zip(lines, renderings, canonicals):
+        if not (rendering and canonical):
+            try:
+                canonical, rendering = Puzzeme(line)
+            except Exception as e:
+                failures.append((line, e))
+                continue
+        tolerable_canonicals.append(canonical)
+        tolerable_renderings.append(rendering)
+    return tolerable_canonicals, tolerable_renderings, failures
+
+
+def chunked(iterable: Iterable, size: int) -> Iterator[List]:
+    """Yield lists of up to size consecutive items of an iterable.
+
+    Use this to bound the memory taken by search_many() when there are too
+    many patterns to hold at once.
+    """
+    iterator = iter(iterable)
+    chunk = list(itertools.islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(itertools.islice(iterator, size))
+
+
+def _tolerate(failures, intolerables):
+    for rendering, e in failures:
+        instrument.count('dictionary.intolerable')
+        if intolerables:
+            intolerables.append((rendering, e))
+
+
 def create_puzzeme_set(ifile: Iterable[str], intolerables=None):
     items = []
-    for rendering in ifile:
-        try:
-            items.append(Puzzeme(rendering))
-        except Exception as e:
-            if intolerables:
-                intolerables.append((rendering, e))
+    with instrument.timer('dictionary.canonicalize'):
+        for lines in chunked(ifile, _CHUNK_LINES):
+            canonicals, renderings, failures = _canonicalize_lines(lines)
+            items.extend(map(Puzzeme.restore, canonicals, renderings))
+            _tolerate(failures, intolerables)
+    if intolerables and len(intolerables):
+        _log.info("%s items in input are intolerable", len(intolerables))
+    return frozenset(items)
+
+
+def _line_ranges(pathname: str, nranges: int) -> List[Tuple[int, int]]:
+    """Split a file into about nranges byte ranges that start and end at line boundaries."""
+    size = os.path.getsize(pathname)
+    bounds = [0]
+    with open(pathname, 'rb') as ifile:
+        for k in range(1, nranges):
+            ifile.seek(max(size * k // nranges, bounds[-1]))
+            ifile.readline()
+            bounds.append(min(ifile.tell(), size))
+    bounds.append(size)
+    return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def _canonicalize_range(pathname: str, start: int, stop: int):
+    with open(pathname, 'rb') as ifile:
+        ifile.seek(start)
+        data = ifile.read(stop - start)
+    # decode as open(pathname, 'r') would, with the default encoding and universal newlines
+    lines = list(io.TextIOWrapper(io.BytesIO(data)))
+    canonicals, renderings, failures = _canonicalize_lines(lines)
+    # joined strings pickle much faster than lists of them
+    return len(canonicals), '\n'.join(canonicals), '\n'.join(renderings), failures
+
+
+def _read_parallel(pathname: str, workers: int, intolerables=None):
+    """Canonicalize a wordlist file in a pool of processes, each reading its own range of lines."""
+    ranges = _line_ranges(pathname, workers * 4)
+    _log.debug("canonicalizing %s in %d ranges with %d workers", pathname, len(ranges), workers)
+    items = []
+    with instrument.timer('dictionary.canonicalize'):
+        if ranges:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                starts, stops = zip(*ranges)
+                for count, canonicals, renderings, failures in executor.map(_canonicalize_range, itertools.repeat(pathname), starts, stops):
+                    if count:
+                        items.extend(map(Puzzeme.restore, canonicals.split('\n'), renderings.split('\n')))
+                    _tolerate(failures, intolerables)
     if intolerables and len(intolerables):
         _log.info("%s items in input are intolerable", len(intolerables))
     return frozenset(items)
 
 
-def read_puzzeme_set(pathname):
-    with open(pathname, 'r') as ifile:
-        return create_puzzeme_set(ifile)
+def _default_workers(pathname: str) -> int:
+    try:
+        large = os.path.getsize(pathname) >= _PARALLEL_MIN_BYTES
+    except OSError:
+        return 1
+    return (os.cpu_count() or 1) if large else 1
+
+
+def read_puzzeme_set(pathname, use_snapshot=True, snapshot_dir=None, workers: int=None, intolerables=None):
+    """Read a wordlist file into a set of puzzemes.
+
+    If use_snapshot is true, the compiled snapshot of the file is loaded
+    instead of the file itself, as long as the snapshot is up to date;
+    otherwise the file is read and a fresh snapshot is written. If the file
+    is read and workers is greater than 1, it is canonicalized in a pool of
+    that many processes; by default, a pool is used for files of at least
+    16 MiB if there is more than one CPU. The intolerables list, if given,
+    is filled only when the file itself is read.
+    """
+    with instrument.timer('dictionary.load'), memory.peak('dictionary.load'):
+        columns = snapshot.load(pathname, directory=snapshot_dir) if use_snapshot else None
+        if columns is not None:
+            instrument.count('dictionary.snapshot_hits')
+            canonicals, renderings = columns
+            puzzemes = frozenset(map(Puzzeme.restore, canonicals, renderings))
+        else:
+            if use_snapshot:
+                instrument.count('dictionary.snapshot_misses')
+            workers = _default_workers(pathname) if workers is None else workers
+            if workers > 1:
+                puzzemes = _read_parallel(pathname, workers, intolerables)
+            else:
+                with open(pathname, 'r') as ifile:
+                    puzzemes = create_puzzeme_set(ifile, intolerables)
+            if use_snapshot:
+                snapshot.save(pathname, {
+                    'canonical': [p.canonical for p in puzzemes],
+                    'rendering': [p.rendering for p in puzzemes],
+                }, directory=snapshot_dir)
+    memory.account('dictionary', puzzemes)
+    return puzzemes
+
+
+def read_puzzeme_table(pathname, use_snapshot=True, snapshot_dir=None) -> PuzzemeTable:
+    """Read a wordlist file into a PuzzemeTable.
+
+    The table is built from the columns of the file's snapshot if it is up
+    to date, without creating a puzzeme per word.
+    """
+    columns = snapshot.load(pathname, directory=snapshot_dir) if use_snapshot else None
+    with instrument.timer('dictionary.table'), memory.peak('dictionary.table'):
+        if columns is not None:
+            instrument.count('dictionary.snapshot_hits')
+            table = PuzzemeTable.from_columns(*columns)
+        else:
+            table = PuzzemeTable.build(read_puzzeme_set(pathname, use_snapshot, snapshot_dir))
+    memory.account('dictionary', table)
+    return table
 
 
 def load_default_puzzemes():
-    return read_puzzeme_set('/usr/share/dict/words')
+    return read_puzzeme_set(DEFAULT_WORDLIST)
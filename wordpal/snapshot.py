@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+
+"""Compiled on-disk snapshots of wordlists.
+
+A snapshot stores the columns derived from a wordlist (canonical forms,
+renderings, and so on) so that the list does not have to be parsed and
+canonicalized again the next time it is loaded. Each snapshot records the
+size, modification time and SHA-1 digest of its source file, and is
+considered stale as soon as those no longer match.
+
+Layout: 8-byte magic, 8-byte little-endian header length, UTF-8 JSON header,
+then one newline-delimited UTF-8 blob per column. The header maps column
+names to (offset, length) pairs relative to the start of the blob area.
+"""
+
+import os
+import io
+import json
+import mmap
+import struct
+import hashlib
+import logging
+import tempfile
+from typing import Dict, List, Optional, Sequence
+
+_log = logging.getLogger(__name__)
+
+_MAGIC = b'PZSNAP01'
+_HEADER_LENGTH = struct.Struct('<Q')
+_SUFFIX = '.pzs'
+_ENV_DIRECTORY = 'PUZZICON_SNAPSHOT_DIR'
+
+
+def default_directory() -> str:
+    """Return the directory where snapshots are kept."""
+    configured = os.getenv(_ENV_DIRECTORY)
+    if configured:
+        return configured
+    cache_home = os.getenv('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_home, 'fun-with-words', 'snapshots')
+
+
+def snapshot_path(source: str, directory: str=None) -> str:
+    """Return the pathname of the snapshot for the given source file."""
+    directory = directory or default_directory()
+    key = hashlib.sha1(os.path.abspath(source).encode('utf-8')).hexdigest()[:20]
+    return os.path.join(directory, key + _SUFFIX)
+
+
+def digest(source: str) -> str:
+    h = hashlib.sha1()
+    with open(source, 'rb') as ifile:
+        for block in iter(lambda: ifile.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def describe_source(source: str, with_digest: bool=True) -> Dict:
+    st = os.stat(source)
+    description = {
+        'path': os.path.abspath(source),
+        'size': st.st_size,
+        'mtime_ns': st.st_mtime_ns,
+    }
+    if with_digest:
+        description['sha1'] = digest(source)
+    return description
+
+
+def _read_header(mm) -> Optional[Dict]:
+    if mm[:len(_MAGIC)] != _MAGIC:
+        return None
+    start = len(_MAGIC)
+    header_length, = _HEADER_LENGTH.unpack_from(mm, start)
+    start += _HEADER_LENGTH.size
+    header = json.loads(mm[start:start + header_length].decode('utf-8'))
+    header['_data_offset'] = start + header_length
+    return header
+
+
+def _is_fresh(header: Dict, source: str) -> bool:
+    recorded = header.get('source', {})
+    current = describe_source(source, with_digest=False)
+    if recorded.get('size') != current['size']:
+        return False
+    if recorded.get('mtime_ns') == current['mtime_ns']:
+        return True
+    # same size but touched; trust the content digest
+    return recorded.get('sha1') == digest(source)
+
+
+def _split_column(blob: bytes, count: int) -> List[str]:
+    if count == 0:
+        return []
+    return blob.decode('utf-8').split('\n')
+
+
+def load(source: str, columns: Sequence[str]=('canonical', 'rendering'), directory: str=None) -> Optional[List[List[str]]]:
+    """Load columns from the snapshot of a source file.
+
+    Return None if there is no snapshot, if it is stale with respect to
+    the source file, or if it lacks any of the requested columns.
+    """
+    pathname = snapshot_path(source, directory)
+    try:
+        with open(pathname, 'rb') as ifile:
+            with mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                header = _read_header(mm)
+                if header is None:
+                    _log.debug("not a snapshot: %s", pathname)
+                    return None
+                if not _is_fresh(header, source):
+                    _log.debug("snapshot %s is stale with respect to %s", pathname, source)
+                    return None
+                count, offset = header['count'], header['_data_offset']
+                loaded = []
+                for name in columns:
+                    try:
+                        start, length = header['columns'][name]
+                    except KeyError:
+                        _log.debug("snapshot %s lacks column %s", pathname, name)
+                        return None
+                    blob = mm[offset + start:offset + start + length]
+                    loaded.append(_split_column(blob, count))
+                return loaded
+    except (OSError, ValueError) as e:
+        _log.debug("snapshot %s not loaded: %s", pathname, e)
+        return None
+
+
+def load_header(source: str, directory: str=None) -> Optional[Dict]:
+    pathname = snapshot_path(source, directory)
+    try:
+        with open(pathname, 'rb') as ifile:
+            with mmap.mmap(ifile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                return _read_header(mm)
+    except (OSError, ValueError):
+        return None
+
+
+def save(source: str, columns: Dict[str, Sequence[str]], directory: str=None) -> Optional[str]:
+    """Write a snapshot of the given columns for a source file.
+
+    All columns must have the same number of rows and no value may contain
+    a newline. The snapshot is written atomically. Return the pathname of
+    the snapshot, or None if it could not be written.
+    """
+    counts = set(len(values) for values in columns.values())
+    assert len(counts) <= 1, "all columns must have the same number of rows"
+    count = counts.pop() if counts else 0
+    pathname = snapshot_path(source, directory)
+    blobs, layout, offset = [], {}, 0
+    for name, values in columns.items():
+        blob = '\n'.join(values).encode('utf-8')
+        layout[name] = [offset, len(blob)]
+        offset += len(blob)
+        blobs.append(blob)
+    try:
+        header = {
+            'source': describe_source(source),
+            'count': count,
+            'columns': layout,
+        }
+        header_bytes = json.dumps(header).encode('utf-8')
+        os.makedirs(os.path.dirname(pathname), exist_ok=True)
+        fd, tmp_pathname = tempfile.mkstemp(prefix='.tmp', suffix=_SUFFIX, dir=os.path.dirname(pathname))
+        try:
+            with io.open(fd, 'wb') as ofile:
+                ofile.write(_MAGIC)
+                ofile.write(_HEADER_LENGTH.pack(len(header_bytes)))
+                ofile.write(header_bytes)
+                for blob in blobs:
+                    ofile.write(blob)
+            os.replace(tmp_pathname, pathname)
+        except BaseException:
+            os.unlink(tmp_pathname)
+            raise
+    except OSError as e:
+        _log.warning("could not write snapshot of %s: %s", source, e)
+        return None
+    _log.debug("wrote snapshot of %s (%d rows) to %s", source, count, pathname)
+    return pathname
+
+
+def add_columns(source: str, columns: Dict[str, Sequence[str]], directory: str=None) -> Optional[str]:
+    """Add columns to an up-to-date snapshot, replacing any with the same names.
+
+    The new columns must be aligned with the rows of the snapshot. Return
+    the pathname of the snapshot, or None if there is no up-to-date
+    snapshot or it could not be written.
+    """
+    header = load_header(source, directory)
+    if header is None:
+        return None
+    names = [name for name in header['columns'] if name not in columns]
+    existing = load(source, names, directory)
+    if existing is None:
+        return None
+    merged = dict(zip(names, existing))
+    merged.update(columns)
+    return save(source, merged, directory)
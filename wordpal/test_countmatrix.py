@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+import unittest
+from . import countmatrix
+from .puzzicon import Puzzeme, Puzzarian
+import common.testing
+
+common.testing.configure_logging()
+
+_CANONICALS = ['SHALE', 'HEALS', 'LEASH', 'HALEST', 'HE', 'SHE', 'ASH', 'HAS', 'EEL', 'THERE']
+
+
+@unittest.skipUnless(countmatrix.available(), "numpy is not installed")
+class TestLetterCountMatrix(unittest.TestCase):
+
+    def test_anagrams(self):
+        matrix = countmatrix.LetterCountMatrix(_CANONICALS)
+        actual = matrix.anagrams(['ALESH', 'SAH', 'QQ', ''])
+        self.assertListEqual([{'SHALE', 'HEALS', 'LEASH'}, {'ASH', 'HAS'}, set(), set()], [set(a) for a in actual])
+
+    def test_spellable(self):
+        matrix = countmatrix.LetterCountMatrix(_CANONICALS)
+        actual = matrix.spellable(['SHE', 'haste'])
+        self.assertListEqual([{'HE', 'SHE'}, {'HE', 'SHE', 'ASH', 'HAS'}], [set(a) for a in actual])
+
+    def test_containing(self):
+        matrix = countmatrix.LetterCountMatrix(_CANONICALS)
+        actual = matrix.containing(['EE', 'THE'])
+        self.assertListEqual([{'EEL', 'THERE'}, {'HALEST', 'THERE'}], [set(a) for a in actual])
+
+    def test_long_and_foreign(self):
+        matrix = countmatrix.LetterCountMatrix(['A' * 300, 'A' * 44])
+        self.assertListEqual([['A' * 300]], matrix.anagrams(['A' * 300]))
+        with self.assertRaises(ValueError):
+            matrix.anagrams(['CAFÉ'])
+
+    def test_puzzarian(self):
+        puzzarian = Puzzarian([Puzzeme('polish'), Puzzeme('Polish'), Puzzeme('foo')])
+        actual = puzzarian.search_letters(['HSILOP'])
+        self.assertSetEqual({'polish', 'Polish'}, set(p.rendering for p in actual[0]))
@@ -4,7 +4,9 @@ import os
 import io
 import sys
 import logging
+import tempfile
 import unittest
+import unittest.mock
 from . import puzzicon
 from .puzzicon import Puzzeme, Puzzarian
 import common.testing
@@ -27,6 +29,32 @@ pumpkin"""
         puzzemes = puzzicon.create_puzzeme_set(ifile)
         self.assertSetEqual(set([Puzzeme('apples'), Puzzeme('peaches'), Puzzeme('pumpkin'),]), puzzemes)
     
+    def test_create_same_as_constructor(self):
+        lines = ["apples\n", "  Peaches \n", "\n", "O'Neill\n", "123\n", "café\n", "x-ray", "   "] * 3
+        expected, expected_intolerables = set(), [None]
+        for line in lines:
+            try:
+                expected.add(Puzzeme(line))
+            except Exception as e:
+                expected_intolerables.append((line, type(e)))
+        intolerables = [None]
+        self.assertSetEqual(expected, puzzicon.create_puzzeme_set(lines, intolerables))
+        self.assertListEqual(expected_intolerables, [intolerables[0]] + [(line, type(e)) for line, e in intolerables[1:]])
+
+    def test_read_parallel(self):
+        with tempfile.TemporaryDirectory() as tempdir:
+            pathname = os.path.join(tempdir, 'words')
+            with open(pathname, 'w') as ofile:
+                for i in range(1000):
+                    print("word" + "abcdefghij"[i % 10] * (i % 7), file=ofile)
+                print("42", file=ofile)
+            serial, parallel = [None], [None]
+            expected = puzzicon.read_puzzeme_set(pathname, use_snapshot=False, workers=1, intolerables=serial)
+            actual = puzzicon.read_puzzeme_set(pathname, use_snapshot=False, workers=2, intolerables=parallel)
+        self.assertSetEqual(expected, actual)
+        self.assertListEqual([None, "42\n"], [parallel[0]] + [line for line, _ in parallel[1:]])
+        self.assertEqual(len(serial), len(parallel))
+
     def test_alphabet(self):
         self.assertEqual(26 * 2, len(puzzicon._ALPHABET))
         self.assertEqual(26 * 2, len(set(puzzicon._ALPHABET)))
@@ -67,6 +95,65 @@ class TestPuzzerarian(unittest.TestCase):
         self.assertEqual(1, len(results))
         self.assertEqual('puzzle', results[0].rendering)
     
+    def test_search_indexed(self):
+        p = Puzzarian(_SIMPLE_PUZZEME_SET)
+        for pattern, expected in [('BA?', {'BAR', 'BAZ'}), ('?A?', {'BAR', 'BAZ', 'GAW'}), ('*O', {'FOO'}), ('[FG]*', {'FOO', 'GAW'}), ('????', set())]:
+            with self.subTest(pattern=pattern):
+                filters = [puzzicon.Filters.canonical_wildcard(pattern)]
+                self.assertSetEqual(expected, set(x.canonical for x in p.search(filters)))
+        self.assertSetEqual({'BAR', 'BAZ'}, set(x.canonical for x in p.candidates([puzzicon.Filters.canonical_wildcard('B??')])))
+        self.assertEqual(4, len(p.candidates([puzzicon.Filters.stature(3)])))
+        self.assertEqual(1, len(p.candidates([puzzicon.Filters.canonical('gaw')])))
+        letters = puzzicon.Filter(('letters',), lambda x: True, [('letters', puzzicon.letter_mask('A'))])
+        with unittest.mock.patch.object(p, '_bucket', wraps=p._bucket) as bucket:
+            self.assertEqual(1, len(p.candidates([letters, puzzicon.Filters.canonical('gaw')])))
+            bucket.assert_called_once_with(('canonical', 'GAW'))
+        self.assertEqual(3, p._estimate(('letters', puzzicon.letter_mask('A'))))
+        self.assertEqual(1, p.positional_index.count('F??'))
+
+    def test_search_planned(self):
+        puzzemes = puzzicon.create_puzzeme_set(['foo', 'food', 'fool', 'bar', 'barbs', 'baz', 'quux'])
+        for p in [Puzzarian(puzzemes), Puzzarian(puzzicon.PuzzemeTable.build(puzzemes))]:
+            for pattern, expected in [('FOO.+', {'FOOD', 'FOOL'}), ('BA[RZ]', {'BAR', 'BAZ'}), ('.*S', {'BARBS'}), ('(?i)quux', {'QUUX'}), ('.{4}', {'FOOD', 'FOOL', 'QUUX'})]:
+                with self.subTest(pattern=pattern):
+                    filters = [puzzicon.Filters.canonical_regex(pattern)]
+                    self.assertSetEqual(expected, set(x.canonical for x in p.search(filters)))
+            self.assertEqual(3, len(p.candidates([puzzicon.Filters.canonical_wildcard('FOO?*')])))
+        plan = Puzzarian(puzzemes).explain([puzzicon.Filters.canonical_regex('FOO.+')])
+        self.assertTrue(plan.startswith("* prefix 'FOO': 3 candidates"), plan)
+        self.assertIn("full scan: 7 candidates", plan)
+        plan = Puzzarian(puzzemes).plan([puzzicon.Filters.canonical_regex('.*S')])
+        self.assertListEqual([(('last', 'S'), 1), (('letters', puzzicon.letter_mask('S')), 1), (None, 7)], plan)
+
+    def test_search_cache(self):
+        p = Puzzarian(_SIMPLE_PUZZEME_SET, cache_size=2)
+        ba, any3 = puzzicon.Filters.canonical_wildcard('BA?'), puzzicon.Filters.stature(3)
+        self.assertSetEqual({'BAR', 'BAZ'}, set(x.canonical for x in p.search([ba, any3])))
+        self.assertSetEqual({'BAR', 'BAZ'}, set(x.canonical for x in p.search([any3, puzzicon.Filters.canonical_wildcard('BA?')])))
+        self.assertDictEqual({'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1, 'capacity': 2}, p.cache_info())
+        p.search([any3])
+        p.search([puzzicon.Filters.canonical('foo')])
+        self.assertEqual(1, p.cache_info()['evictions'])
+        p.add([Puzzeme('bat')])
+        self.assertEqual(0, p.cache_info()['size'])
+        self.assertSetEqual({'BAR', 'BAZ', 'BAT'}, set(x.canonical for x in p.search([ba])))
+        self.assertEqual(1, len(list(p.search([lambda x: x.canonical == 'FOO']))))
+        uncached = Puzzarian(_SIMPLE_PUZZEME_SET)
+        uncached.search([ba])
+        self.assertDictEqual({'hits': 0, 'misses': 0, 'evictions': 0, 'size': 0, 'capacity': 0}, uncached.cache_info())
+
+    def test_search_patterns(self):
+        puzzemes = puzzicon.create_puzzeme_set(['foo', 'food', 'fool', 'bar', 'Bar', 'barbs', 'baz', 'gaw', 'quux'])
+        patterns = ['BA?', '?A?', 'FOO?', '????', 'BA?', '???', 'F*', 'QU[A-Z]X', 'ZZZ', '?????Q']
+        for p in [Puzzarian(puzzemes), Puzzarian(puzzicon.PuzzemeTable.build(puzzemes))]:
+            results = p.search_many(iter(patterns))
+            self.assertEqual(len(patterns), len(results))
+            for pattern, matches in zip(patterns, results):
+                with self.subTest(pattern=pattern):
+                    expected = p.search([puzzicon.Filters.canonical_wildcard(pattern)])
+                    self.assertListEqual(sorted(expected), sorted(matches))
+            self.assertEqual(3, len(results[0]))
+
     def test_has_canonical(self):
         p = Puzzarian(_SIMPLE_PUZZEME_SET)
         self.assertTrue(p.has_canonical('baz'))
@@ -74,6 +161,57 @@ class TestPuzzerarian(unittest.TestCase):
         self.assertFalse(p.has_canonical('oranges'))
 
 
+class TestPositionalIndex(unittest.TestCase):
+
+    def test_match(self):
+        index = puzzicon.PositionalIndex(_SIMPLE_PUZZEME_SET)
+        test_cases = [
+            ('BA?', {'BAR', 'BAZ'}),
+            ('?A?', {'BAR', 'BAZ', 'GAW'}),
+            ('???', {'FOO', 'BAR', 'BAZ', 'GAW'}),
+            ('F?O', {'FOO'}),
+            ('B?O', set()),
+            ('??', set()),
+            ('ba?', set()),
+        ]
+        for pattern, expected in test_cases:
+            with self.subTest(pattern=pattern):
+                self.assertSetEqual(expected, set(p.canonical for p in index.match(pattern)))
+
+    def test_match_unsupported(self):
+        index = puzzicon.PositionalIndex(_SIMPLE_PUZZEME_SET)
+        self.assertIsNone(index.match('B*'))
+        self.assertIsNone(index.match('[AB]??'))
+
+
+class TestPuzzemeTable(unittest.TestCase):
+
+    def test_build(self):
+        puzzemes = puzzicon.create_puzzeme_set(['foo', 'Foo', 'bar', 'Baz', 'bar'])
+        table = puzzicon.PuzzemeTable.build(puzzemes)
+        self.assertEqual(4, len(table))
+        self.assertSetEqual(set(puzzemes), set(table))
+        self.assertListEqual(['BAR', 'BAZ', 'FOO', 'FOO'], list(table.canonicals()))
+        self.assertEqual(range(2, 4), table.find('FOO'))
+        self.assertEqual(0, len(table.find('QUX')))
+        self.assertIn(Puzzeme('Foo'), table)
+        self.assertNotIn(Puzzeme('qux'), table)
+        self.assertEqual(Puzzeme('Baz'), table[-3])
+
+    def test_puzzarian(self):
+        expected = Puzzarian(_SIMPLE_PUZZEME_SET)
+        actual = Puzzarian(puzzicon.PuzzemeTable.build(_SIMPLE_PUZZEME_SET))
+        for pattern in ['BA?', '?A?', '*O', '[FG]*', '????', 'gaw']:
+            with self.subTest(pattern=pattern):
+                f = puzzicon.Filters.canonical_wildcard(pattern)
+                self.assertSetEqual(set(expected.search([f])), set(actual.search([f])))
+        f = puzzicon.Filters.canonical('gaw')
+        self.assertSetEqual(set(expected.search([f])), set(actual.search([f])))
+        self.assertTrue(actual.has_canonical('baz'))
+        self.assertFalse(actual.has_canonical('oranges'))
+        self.assertSetEqual(set(expected.puzzeme_dict.keys()), set(actual.puzzeme_dict.keys()))
+
+
 class TestFilters(unittest.TestCase):
 
     def test_canonical_literal(self):
@@ -93,6 +231,63 @@ class TestFilters(unittest.TestCase):
         self.assertFalse(f(Puzzeme('puzzles')))
         self.assertTrue(f(Puzzeme('pubzle')))
     
+    def test_hashable(self):
+        F = puzzicon.Filters
+        self.assertEqual(F.stature(3), F.stature(3))
+        self.assertEqual(F.canonical('foo'), F.canonical('FOO'))
+        self.assertNotEqual(F.canonical_wildcard('FOO'), F.canonical('FOO'))
+        self.assertEqual(F.conjoin([F.stature(3), F.canonical_regex('F.O')]), F.conjoin([F.canonical_regex('F.O'), F.stature(3), F.stature(3)]))
+        self.assertEqual(F.stature(3), F.conjoin([F.stature(3)]))
+        self.assertEqual(1, len({F.canonical_wildcard('B?'), F.canonical_wildcard('B?')}))
+        self.assertFalse(isinstance(F.conjoin([F.stature(3), lambda p: True]), puzzicon.Filter))
+
+    def test_regex_conditions(self):
+        conditions = puzzicon._regex_conditions(r'^AB[CD]{2,3}E+$')
+        self.assertDictEqual({'min_length': 5, 'max_length': None, 'prefix': 'AB', 'suffix': '', 'letters': 'ABE'}, conditions)
+        conditions = puzzicon._regex_conditions(r'(?i)ab.')
+        self.assertDictEqual({'min_length': 3, 'max_length': 3, 'prefix': '', 'suffix': '', 'letters': ''}, conditions)
+        self.assertListEqual([('stature', 4), ('prefix', 'PU'), ('last', 'S'), ('letters', puzzicon.letter_mask('PUS'))], puzzicon._condition_hints(puzzicon._regex_conditions('PU.S')))
+
+    def test_adaptive_conjunction(self):
+        puzzemes = [Puzzeme(w) for w in ('cat', 'dog', 'cart', 'pin', 'cotton', 'coat', 'puzzle') * 20]
+        slow_pass = puzzicon.Filter(('slow',), lambda p: len(p.rendering * 50) > 0)
+        selective = puzzicon.Filter(('selective',), lambda p: p.canonical.startswith('CO'))
+        conjunction = puzzicon.Filters.conjoin([slow_pass, selective]).adaptive()
+        conjunction.SAMPLE_INTERVAL = 1
+        expected = [p for p in puzzemes if slow_pass(p) and selective(p)]
+        self.assertListEqual(expected, [p for p in puzzemes if conjunction(p)])
+        self.assertListEqual([selective, slow_pass], conjunction.ordering())
+        report = conjunction.report()
+        self.assertEqual(1, report[0]['position'])
+        self.assertAlmostEqual(1.0, report[1]['pass_rate'])
+        plain = puzzicon.Filters.conjoin([slow_pass._predicate, selective._predicate])
+        self.assertIsInstance(plain, puzzicon.AdaptiveConjunction)
+        plain.SAMPLE_INTERVAL = 1
+        self.assertListEqual(expected, [p for p in puzzemes if plain(p)])
+        self.assertListEqual([slow_pass._predicate, selective._predicate], plain.ordering())
+        f = puzzicon.Filters.conjoin([puzzicon.Filters.stature(4), puzzicon.Filters.canonical_wildcard('C*')])
+        self.assertListEqual([p for p in puzzemes if p.canonical in ('CART', 'COAT')], [p for p in puzzemes if f(p)])
+        adaptive = f.adaptive()
+        self.assertListEqual([p for p in puzzemes if f(p)], [p for p in puzzemes if adaptive(p)])
+        self.assertEqual(2, len(adaptive.report()))
+
+    def test_adaptive_conjunction_guard(self):
+        puzzemes = puzzicon.create_puzzeme_set(['ab', 'abcd', 'wxyz', 'abcx'])
+        for cache_size in (0, 16):
+            p = Puzzarian(puzzemes, cache_size=cache_size)
+            guarded = [lambda p: len(p.canonical) > 3, lambda p: p.canonical[3] == 'X']
+            self.assertListEqual(['ABCX'], [x.canonical for x in p.search(guarded)])
+            guarded = [puzzicon.Filters.stature(4), lambda p: p.canonical[3] == 'X', puzzicon.Filters.canonical_wildcard('A*')]
+            self.assertListEqual(['ABCX'], [x.canonical for x in p.search(guarded)])
+        conjunction = puzzicon.Filters.conjoin(guarded)
+        conjunction.SAMPLE_INTERVAL = 1
+        for x in puzzemes:
+            conjunction(x)
+        self.assertIs(guarded[1], conjunction.ordering()[1])
+
+    def test_parse_wildcard(self):
+        self.assertListEqual(['A', '?', '[BC]', '*', '[!]D]', '['], puzzicon._parse_wildcard('A?[BC]*[!]D]['))
+
     def test_canonical_regex_star(self):
         f = puzzicon.Filters.canonical_wildcard('PU*ZLE')
         self.assertTrue(f(Puzzeme('puzzle')))
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+
+import os
+import tempfile
+import unittest
+from . import puzzicon, snapshot
+from .puzzicon import Puzzeme
+import common.testing
+
+common.testing.configure_logging()
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.source = os.path.join(self.tempdir.name, 'words')
+        self.snapshot_dir = os.path.join(self.tempdir.name, 'snapshots')
+        with open(self.source, 'w') as ofile:
+            ofile.write("apples\npeaches\nPumpkins\n")
+
+    def tearDown(self):
+        self.tempdir.cleanup()
+
+    def test_save_load(self):
+        snapshot.save(self.source, {'a': ['x', 'y'], 'b': ['1', '2']}, directory=self.snapshot_dir)
+        self.assertListEqual([['x', 'y'], ['1', '2']], snapshot.load(self.source, ('a', 'b'), directory=self.snapshot_dir))
+        self.assertIsNone(snapshot.load(self.source, ('c',), directory=self.snapshot_dir))
+
+    def test_load_missing(self):
+        self.assertIsNone(snapshot.load(self.source, directory=self.snapshot_dir))
+
+    def test_save_load_empty(self):
+        snapshot.save(self.source, {'a': []}, directory=self.snapshot_dir)
+        self.assertListEqual([[]], snapshot.load(self.source, ('a',), directory=self.snapshot_dir))
+
+    def test_read_puzzeme_set(self):
+        expected = puzzicon.read_puzzeme_set(self.source, use_snapshot=False)
+        first = puzzicon.read_puzzeme_set(self.source, snapshot_dir=self.snapshot_dir)
+        self.assertTrue(os.path.exists(snapshot.snapshot_path(self.source, self.snapshot_dir)))
+        second = puzzicon.read_puzzeme_set(self.source, snapshot_dir=self.snapshot_dir)
+        self.assertSetEqual(expected, first)
+        self.assertSetEqual(expected, second)
+        self.assertSetEqual(set(['APPLES', 'PEACHES', 'PUMPKINS']), set(p.canonical for p in second))
+        self.assertIn('Pumpkins', set(p.rendering for p in second))
+
+    def test_stale(self):
+        puzzicon.read_puzzeme_set(self.source, snapshot_dir=self.snapshot_dir)
+        with open(self.source, 'a') as ofile:
+            ofile.write("plums\n")
+        self.assertIsNone(snapshot.load(self.source, directory=self.snapshot_dir))
+        puzzemes = puzzicon.read_puzzeme_set(self.source, snapshot_dir=self.snapshot_dir)
+        self.assertIn(Puzzeme('plums'), puzzemes)
+        self.assertIsNotNone(snapshot.load(self.source, directory=self.snapshot_dir))
+
+    def test_touched_same_content(self):
+        puzzicon.read_puzzeme_set(self.source, snapshot_dir=self.snapshot_dir)
+        st = os.stat(self.source)
+        os.utime(self.source, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+        self.assertIsNotNone(snapshot.load(self.source, directory=self.snapshot_dir))